@@ -57,6 +57,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Añadido para archivos estáticos
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'records.middleware.SlidingSessionMiddleware',  # Debe ir después de SessionMiddleware
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -120,6 +121,19 @@ else:
         }
     }
 
+# Caché compartida entre workers (opcional, requiere el paquete redis). Sin REDIS_URL se usa la
+# LocMemCache por defecto, local a cada worker de gunicorn: las cachés que se invalidan al escribir
+# (desplegables de filtros, totales de listados) solo se activan con una caché compartida
+# (ver records.utils.cache_is_shared).
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -214,7 +228,32 @@ ADMIN_EMAILS = ['jcorrea@lapocion.com', 'venriquez@lapocion.com', 'wcastro@lapoc
 
 # Session timeout settings
 SESSION_COOKIE_AGE = 3600  # 1 hour in seconds
-SESSION_SAVE_EVERY_REQUEST = True
+# La expiración deslizante la maneja records.middleware.SlidingSessionMiddleware:
+# la sesión solo se vuelve a guardar cuando le quedan menos de SESSION_REFRESH_THRESHOLD
+# segundos de vida, así que un usuario activo genera como máximo una escritura cada
+# (SESSION_COOKIE_AGE - SESSION_REFRESH_THRESHOLD) segundos en lugar de una por petición.
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_THRESHOLD = int(os.getenv('SESSION_REFRESH_THRESHOLD', 3300))
+# 'django.contrib.sessions.backends.cached_db' evita también la lectura por petición,
+# pero solo es seguro con una caché compartida entre workers (no con LocMemCache).
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
+# Ventana (en segundos) para considerar "similar" un recibo con la misma fecha, banco y valor
+# pero hora distinta: cubre horas tecleadas desde capturas diferentes.
+SIMILAR_DUPLICATE_TOLERANCE_SECONDS = int(os.getenv('SIMILAR_DUPLICATE_TOLERANCE_SECONDS', 120))
+
+# Totales de los listados paginados (ver records.pagination.cached_count): se cachean
+# LIST_COUNT_CACHE_TTL segundos por filtro y, por encima de LIST_COUNT_ESTIMATE_THRESHOLD filas,
+# se muestra la estimación del planificador de PostgreSQL en lugar de un COUNT(*) exacto.
+# Sin caché compartida (REDIS_URL) las escrituras solo invalidarían los totales del worker
+# que las hizo, así que solo se cachean las estimaciones y los totales exactos se cuentan siempre.
+LIST_COUNT_CACHE_TTL = int(os.getenv('LIST_COUNT_CACHE_TTL', 60))
+LIST_COUNT_ESTIMATE_THRESHOLD = int(os.getenv('LIST_COUNT_ESTIMATE_THRESHOLD', 10000))
+
+# Opciones cacheadas de los desplegables de filtros (ver records.choices): se invalidan al
+# escribir en bancos, vendedores, orígenes, tipos de transacción, usuarios y facturadores.
+# Solo con caché compartida; con LocMemCache las listas se leen de la BD en cada render.
+FILTER_CHOICES_CACHE_TTL = int(os.getenv('FILTER_CHOICES_CACHE_TTL', 3600))
 
 # Configuraciones de seguridad para producción
 if not DEBUG:
@@ -2,7 +2,7 @@
 from django.contrib import admin
 from .models import (
     FinancialRecord, Bank, AccessRequest, Seller, OrigenTransaccion, Client,
-    Transaction, TransactionType, DuplicateRecordAttempt, AuthorizedUser
+    Transaction, TransactionType, DuplicateRecordAttempt, AuthorizedUser, BankImportProfile
 )
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
@@ -25,6 +25,12 @@ class BankAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
+@admin.register(BankImportProfile)
+class BankImportProfileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'bank', 'date_format', 'decimal_separator', 'sign_convention')
+    list_filter = ('bank',)
+    search_fields = ('name', 'bank__name')
+
 @admin.register(AccessRequest)
 class AccessRequestAdmin(admin.ModelAdmin):
     list_display = ('user', 'approved', 'timestamp')
@@ -175,10 +181,10 @@ class TransactionTypeAdmin(admin.ModelAdmin):
 
 @admin.register(DuplicateRecordAttempt)
 class DuplicateRecordAttemptAdmin(admin.ModelAdmin):
-    list_display = ('timestamp', 'user', 'attempt_type', 'is_resolved', 'resolved_by', 'resolved_at')
+    list_display = ('timestamp', 'last_seen', 'occurrences', 'user', 'attempt_type', 'is_resolved', 'resolved_by', 'resolved_at')
     list_filter = ('is_resolved', 'attempt_type', 'timestamp')
     search_fields = ('user__username',)
-    readonly_fields = ('timestamp', 'user', 'data', 'resolved_by', 'resolved_at')
+    readonly_fields = ('timestamp', 'last_seen', 'occurrences', 'fingerprint', 'user', 'data', 'resolved_by', 'resolved_at')
 
 @admin.register(AuthorizedUser)
 class AuthorizedUserAdmin(admin.ModelAdmin):
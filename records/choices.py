@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Bank, OrigenTransaccion, Seller, Transaction, TransactionType
+from .utils import cache_is_shared
+
+FILTER_CHOICES_PREFIX = 'filter-choices'
+FACTURADOR_CHOICES = 'facturador'
+
+# Modelos de referencia de los desplegables de filtros (invalidados en records.signals)
+REFERENCE_MODELS = (Bank, Seller, OrigenTransaccion, TransactionType, User)
+
+
+def _cache_key(name):
+    return f'{FILTER_CHOICES_PREFIX}:{name}'
+
+
+def _cached(name, build):
+    # Sin caché compartida la invalidación no llegaría a los demás workers: se lee la BD
+    if not cache_is_shared():
+        return build()
+    return cache.get_or_set(_cache_key(name), build, settings.FILTER_CHOICES_CACHE_TTL)
+
+
+def model_choices(model):
+    """
+    Callable para `choices` de un ChoiceFilter con los (pk, str(obj)) de un modelo de referencia.
+    Con caché compartida no consulta la BD en cada render como ModelChoiceFilter: la lista se
+    cachea y se invalida al escribir en el modelo (ver records.signals).
+    """
+    return lambda: _cached(
+        model._meta.label_lower, lambda: [(obj.pk, str(obj)) for obj in model._default_manager.all()]
+    )
+
+
+def facturador_choices():
+    """Facturadores distintos registrados en transacciones, cacheados (ver model_choices)."""
+    return _cached(FACTURADOR_CHOICES, lambda: list(
+        Transaction.objects.exclude(facturador__isnull=True).exclude(facturador__exact='')
+        .values_list('facturador', 'facturador').distinct().order_by('facturador')
+    ))
+
+
+def invalidate_filter_choices(*names):
+    """Descarta las listas cacheadas (nombres: label_lower del modelo o FACTURADOR_CHOICES)."""
+    if not cache_is_shared():
+        return
+    keys = [_cache_key(name) for name in names]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def facturador_choices_stale(facturador):
+    """True si hay lista de facturadores cacheada y no incluye `facturador`."""
+    cached = cache.get(_cache_key(FACTURADOR_CHOICES))
+    return cached is not None and all(value != facturador for value, _ in cached)
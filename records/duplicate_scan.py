@@ -0,0 +1,109 @@
+import numpy as np
+
+from .models import Bank, DuplicateRecordAttempt, FinancialRecord
+from .services import duplicate_fingerprint, record_duplicate_attempts
+
+SCAN_CHUNK_SIZE = 20000
+SECONDS_PER_DAY = 86400
+
+
+def find_near_duplicate_clusters(banks, cents, timestamps, window_seconds):
+    """
+    Agrupa posibles duplicados: mismo banco, mismo valor y marcas de tiempo a no más de
+    `window_seconds` de la anterior (enlace simple). Recibe arrays de NumPy paralelos y
+    devuelve una lista de arrays con los índices (posiciones en los arrays de entrada)
+    de cada grupo de 2 o más recibos.
+
+    Ordenar por (banco, valor, timestamp) es O(n log n); después basta comparar cada
+    recibo con su vecino, de forma vectorizada.
+    """
+    if len(banks) < 2:
+        return []
+    order = np.lexsort((timestamps, cents, banks))
+    sorted_banks = banks[order]
+    sorted_cents = cents[order]
+    sorted_timestamps = timestamps[order]
+
+    linked = (
+        (sorted_banks[1:] == sorted_banks[:-1])
+        & (sorted_cents[1:] == sorted_cents[:-1])
+        & (sorted_timestamps[1:] - sorted_timestamps[:-1] <= window_seconds)
+    )
+    # Cada recibo no enlazado con el anterior abre un grupo nuevo
+    starts = np.flatnonzero(np.concatenate(([True], ~linked)))
+    sizes = np.diff(np.append(starts, len(order)))
+    return [order[start:start + size] for start, size in zip(starts[sizes > 1], sizes[sizes > 1])]
+
+
+def load_receipt_arrays(since=None):
+    """Carga los recibos como arrays de NumPy: (pks, bancos, valor en centavos, timestamp en segundos)."""
+    queryset = FinancialRecord.objects.all()
+    if since:
+        queryset = queryset.filter(fecha__gte=since)
+    rows = queryset.values_list('pk', 'banco_llegada_id', 'valor', 'fecha', 'hora').iterator(chunk_size=SCAN_CHUNK_SIZE)
+
+    pks, banks, cents, timestamps = [], [], [], []
+    for pk, bank_id, valor, fecha, hora in rows:
+        pks.append(pk)
+        banks.append(bank_id)
+        cents.append(int(valor * 100))
+        timestamps.append(
+            fecha.toordinal() * SECONDS_PER_DAY + hora.hour * 3600 + hora.minute * 60 + hora.second
+        )
+    return (
+        np.array(pks, dtype=np.int64),
+        np.array(banks, dtype=np.int64),
+        np.array(cents, dtype=np.int64),
+        np.array(timestamps, dtype=np.int64),
+    )
+
+
+def scan_near_duplicates(window_seconds=120, since=None, dry_run=False):
+    """
+    Escaneo completo (o desde `since`) del histórico de recibos en busca de posibles duplicados.
+    Registra cada grupo nuevo como un DuplicateRecordAttempt de tipo NEAR_DUPLICATE; los grupos
+    ya reportados en escaneos anteriores (mismos recibos) no se vuelven a registrar.
+    Devuelve (grupos encontrados, intentos registrados).
+    """
+    pks, banks, cents, timestamps = load_receipt_arrays(since)
+    clusters = [pks[indexes] for indexes in find_near_duplicate_clusters(banks, cents, timestamps, window_seconds)]
+    if not clusters:
+        return 0, 0
+
+    already_reported = {
+        tuple(data.get('receipt_ids', []))
+        for data in DuplicateRecordAttempt.objects.filter(attempt_type='NEAR_DUPLICATE').values_list('data', flat=True)
+    }
+    new_clusters = [sorted(int(pk) for pk in cluster) for cluster in clusters]
+    new_clusters = [ids for ids in new_clusters if tuple(ids) not in already_reported]
+    if dry_run or not new_clusters:
+        return len(clusters), 0
+
+    receipts = FinancialRecord.objects.in_bulk([pk for ids in new_clusters for pk in ids])
+    bank_names = dict(Bank.objects.values_list('pk', 'name'))
+    attempts = []
+    for ids in new_clusters:
+        members = sorted((receipts[pk] for pk in ids if pk in receipts), key=lambda r: (r.fecha, r.hora))
+        if len(members) < 2:
+            continue
+        first = members[0]
+        attempts.append(DuplicateRecordAttempt(
+            attempt_type='NEAR_DUPLICATE',
+            fingerprint=duplicate_fingerprint(first.fecha, first.hora, first.comprobante, first.banco_llegada_id, first.valor),
+            banco_llegada_id=first.banco_llegada_id,
+            fecha=first.fecha,
+            hora=first.hora,
+            comprobante=first.comprobante,
+            valor=first.valor,
+            data={
+                'receipt_ids': ids,
+                'fecha': str(first.fecha),
+                'hora': ', '.join(str(r.hora) for r in members),
+                'comprobante': ', '.join(r.comprobante for r in members),
+                'banco_llegada': bank_names.get(first.banco_llegada_id, ''),
+                'valor': str(first.valor),
+            },
+        ))
+    # Un grupo que creció desde el último escaneo (mismo primer recibo) actualiza su intento abierto
+    record_duplicate_attempts(attempts)
+    return len(clusters), len(attempts)
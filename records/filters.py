@@ -1,8 +1,32 @@
 import django_filters
-from .models import FinancialRecord, DuplicateRecordAttempt, Bank, Transaction, Client, OrigenTransaccion, Seller
+from .choices import facturador_choices, model_choices
+from .models import FinancialRecord, DuplicateRecordAttempt, Bank, Transaction, Client, OrigenTransaccion, Seller, TransactionType
 from django.contrib.auth.models import User
 from django import forms
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from decimal import Decimal
+
+# Modos del filtro de valor. Todos salvo 'contiene' comparan sobre la columna numérica
+# (indexada); 'contiene' conserva la búsqueda antigua por dígitos, que convierte cada valor a
+# texto y recorre la tabla completa.
+AMOUNT_MATCH_CHOICES = (
+    ('exacto', 'Exacto'),
+    ('aproximado', 'Aproximado (± tolerancia)'),
+    ('contiene', 'Contiene dígitos'),
+)
+DEFAULT_AMOUNT_TOLERANCE = Decimal('1000')
+
+
+def filter_amount(queryset, field_name, value, mode=None, tolerance=None):
+    """Filtra `field_name` por `value` según el modo elegido (por defecto, exacto)."""
+    if value is None:
+        return queryset
+    if mode == 'contiene':
+        return queryset.filter(**{f'{field_name}__icontains': format(value.normalize(), 'f')})
+    if mode == 'aproximado':
+        tolerance = abs(tolerance) if tolerance is not None else DEFAULT_AMOUNT_TOLERANCE
+        return queryset.filter(**{f'{field_name}__range': (value - tolerance, value + tolerance)})
+    return queryset.filter(**{field_name: value})
 
 
 class FinancialRecordFilter(django_filters.FilterSet):
@@ -49,19 +73,42 @@ class DuplicateRecordAttemptFilter(django_filters.FilterSet):
         label='Hasta',
         widget=forms.DateInput(attrs={'type': 'date'})
     )
-    user = django_filters.ModelChoiceFilter(
-        queryset=User.objects.all(),
+    # Desplegables con opciones cacheadas si la caché es compartida (ver choices.model_choices)
+    user = django_filters.ChoiceFilter(
+        choices=model_choices(User),
         label='Usuario'
     )
-    banco = django_filters.CharFilter(
-        field_name='data__banco_llegada',
-        lookup_expr='icontains',
+    # Filtros sobre las columnas tipadas e indexadas del intento (no sobre el JSON `data`)
+    banco = django_filters.ChoiceFilter(
+        field_name='banco_llegada',
+        choices=model_choices(Bank),
         label='Banco'
     )
+    fecha__gte = django_filters.DateFilter(
+        field_name='fecha',
+        lookup_expr='gte',
+        label='Fecha recibo desde',
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    fecha__lte = django_filters.DateFilter(
+        field_name='fecha',
+        lookup_expr='lte',
+        label='Fecha recibo hasta',
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    comprobante = django_filters.CharFilter(
+        field_name='comprobante',
+        lookup_expr='exact',
+        label='Comprobante'
+    )
+    valor = django_filters.NumberFilter(
+        field_name='valor',
+        label='Valor'
+    )
 
     class Meta:
         model = DuplicateRecordAttempt
-        fields = ['user', 'timestamp__gte', 'timestamp__lte', 'banco']
+        fields = ['user', 'timestamp__gte', 'timestamp__lte', 'banco', 'fecha__gte', 'fecha__lte', 'comprobante', 'valor', 'attempt_type']
 
 class TransactionFilter(django_filters.FilterSet):
     id = django_filters.NumberFilter(
@@ -87,9 +134,10 @@ class TransactionFilter(django_filters.FilterSet):
     )
 
     def filter_by_client_name_or_dni(self, queryset, name, value):
-        return queryset.filter(
-            Q(cliente__name__icontains=value) | Q(cliente__dni__icontains=value)
-        ).distinct()
+        # Subconsulta EXISTS sobre clientes: sin JOIN en la consulta principal ni distinct()
+        return queryset.filter(Exists(
+            Client.objects.filter(pk=OuterRef('cliente_id')).filter(Q(name__icontains=value) | Q(dni__icontains=value))
+        ))
 
     vendedor = django_filters.CharFilter(
         field_name='vendedor__name',
@@ -112,9 +160,41 @@ class TransactionFilter(django_filters.FilterSet):
     )
     valor = django_filters.NumberFilter(
         field_name='expected_amount',
-        lookup_expr='icontains',
+        method='filter_valor',
         label='Valor'
     )
+    valor_modo = django_filters.ChoiceFilter(
+        choices=AMOUNT_MATCH_CHOICES,
+        empty_label='Exacto',
+        method='filter_valor_options',
+        label='Búsqueda de valor'
+    )
+    valor_tolerancia = django_filters.NumberFilter(
+        method='filter_valor_options',
+        label='Tolerancia (±)'
+    )
+    valor__gte = django_filters.NumberFilter(
+        field_name='expected_amount',
+        lookup_expr='gte',
+        label='Valor desde'
+    )
+    valor__lte = django_filters.NumberFilter(
+        field_name='expected_amount',
+        lookup_expr='lte',
+        label='Valor hasta'
+    )
+
+    def filter_valor(self, queryset, name, value):
+        return filter_amount(
+            queryset, name, value,
+            mode=self.form.cleaned_data.get('valor_modo'),
+            tolerance=self.form.cleaned_data.get('valor_tolerancia'),
+        )
+
+    def filter_valor_options(self, queryset, name, value):
+        # Modo y tolerancia solo modifican el filtro `valor` (ver filter_valor)
+        return queryset
+
     # --- INICIO: Nuevo filtro para estado de recibos ---
     receipt_status = django_filters.ChoiceFilter(
         choices=FinancialRecord.APROVED_CHOICES,
@@ -123,33 +203,44 @@ class TransactionFilter(django_filters.FilterSet):
     )
 
     def filter_receipt_status(self, queryset, name, value):
-        # If the value is 'Aprobado', we want transactions where ALL receipts are approved.
+        # Uses the denormalized receipt counters on Transaction: no join, no distinct().
+        # If the value is 'Aprobado', we want transactions where ALL receipts are approved
+        # (at least one receipt and none pending or rejected).
         if value == 'Aprobado':
-            # We exclude transactions that have pending or rejected receipts.
-            # Additionally, we ensure that the transaction has at least one receipt.
-            return queryset.filter(receipts__isnull=False).exclude(
-                Q(receipts__payment_status='Pendiente') | Q(receipts__payment_status='Rechazado')
-            ).distinct()
-        
-        # For other statuses like 'Pendiente' or 'Rechazado', the default behavior is sufficient:
-        # show transactions that have AT LEAST ONE receipt with that status.
-        elif value in [choice[0] for choice in FinancialRecord.APROVED_CHOICES if choice[0] != 'Aprobado']:
-            return queryset.filter(receipts__payment_status=value).distinct()
+            return queryset.filter(receipt_count__gt=0, pending_receipt_count=0, rejected_receipt_count=0)
+
+        # For 'Pendiente' or 'Rechazado': transactions with AT LEAST ONE receipt with that status.
+        elif value == 'Pendiente':
+            return queryset.filter(pending_receipt_count__gt=0)
+        elif value == 'Rechazado':
+            return queryset.filter(rejected_receipt_count__gt=0)
 
         # If no value is selected, return the queryset without changes.
         return queryset
     
-    origen_transaccion = django_filters.ModelChoiceFilter(
-        field_name='receipts__origen_transaccion',
-        queryset=OrigenTransaccion.objects.all(),
-        label='Origen Transacción'
+    origen_transaccion = django_filters.ChoiceFilter(
+        choices=model_choices(OrigenTransaccion),
+        label='Origen Transacción',
+        method='filter_by_receipt_origen'
+    )
+    transaction_type = django_filters.ChoiceFilter(
+        choices=model_choices(TransactionType),
+        label='Tipo de Transacción'
     )
 
+    def filter_by_receipt_origen(self, queryset, name, value):
+        # Transacciones con AL MENOS un recibo de ese origen. El JOIN con recibos repetía la
+        # transacción una vez por recibo; EXISTS la devuelve una sola vez.
+        return queryset.filter(Exists(
+            FinancialRecord.objects.filter(transaction=OuterRef('pk'), origen_transaccion=value)
+        ))
+
     class Meta:
         model = Transaction
         fields = ['unique_transaction_id', 'date__gte', 
                   'date__lte', 'cliente', 'vendedor', 'facturador', 'numero_factura', 'status',
-                    'valor','transaction_type', 'receipt_status', 'origen_transaccion']
+                    'valor', 'valor_modo', 'valor_tolerancia', 'valor__gte', 'valor__lte',
+                    'transaction_type', 'receipt_status', 'origen_transaccion']
 
 
 
@@ -172,8 +263,9 @@ class CreditFilter(django_filters.FilterSet):
         label='Comprobante',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': '# Comprobante'})
     )
-    banco_llegada = django_filters.ModelChoiceFilter(
-        queryset=Bank.objects.all(),
+    # Desplegables con opciones cacheadas si la caché es compartida (ver choices.model_choices)
+    banco_llegada = django_filters.ChoiceFilter(
+        choices=model_choices(Bank),
         label='Banco',
         widget=forms.Select(attrs={'class': 'form-select'}) # 'form-select' es mejor para Bootstrap 5
     )
@@ -192,13 +284,48 @@ class CreditFilter(django_filters.FilterSet):
 
     valor = django_filters.NumberFilter(
         field_name='valor',
-        lookup_expr='icontains', # 'exact' es mejor para números que 'icontains'
+        method='filter_valor',
         label='Valor',
         widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Valor del recibo...'})
     )
+    valor_modo = django_filters.ChoiceFilter(
+        choices=AMOUNT_MATCH_CHOICES,
+        empty_label='Exacto',
+        method='filter_valor_options',
+        label='Búsqueda de valor',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    valor_tolerancia = django_filters.NumberFilter(
+        method='filter_valor_options',
+        label='Tolerancia (±)',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '1000'})
+    )
+    valor__gte = django_filters.NumberFilter(
+        field_name='valor',
+        lookup_expr='gte',
+        label='Valor desde',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    valor__lte = django_filters.NumberFilter(
+        field_name='valor',
+        lookup_expr='lte',
+        label='Valor hasta',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+
+    def filter_valor(self, queryset, name, value):
+        return filter_amount(
+            queryset, name, value,
+            mode=self.form.cleaned_data.get('valor_modo'),
+            tolerance=self.form.cleaned_data.get('valor_tolerancia'),
+        )
+
+    def filter_valor_options(self, queryset, name, value):
+        # Modo y tolerancia solo modifican el filtro `valor` (ver filter_valor)
+        return queryset
 
-    uploaded_by = django_filters.ModelChoiceFilter(
-        queryset=User.objects.all(),
+    uploaded_by = django_filters.ChoiceFilter(
+        choices=model_choices(User),
         field_name='uploaded_by',
         label='Subido por',
         widget=forms.Select(attrs={'class': 'form-select'})
@@ -212,21 +339,22 @@ class CreditFilter(django_filters.FilterSet):
         1. En el campo 'cliente' del propio recibo (para abonos).
         2. En el campo 'cliente' de la transacción asociada al recibo.
         """
-        return queryset.filter(
-            Q(cliente__name__icontains=value) | Q(cliente__dni__icontains=value) |
-            Q(transaction__cliente__name__icontains=value) | Q(transaction__cliente__dni__icontains=value)
-        ).distinct()
+        # effective_client ya resuelve el cliente directo o el de la transacción: basta una
+        # subconsulta sobre clientes, sin JOIN con transacciones ni distinct().
+        return queryset.filter(Exists(
+            Client.objects.filter(pk=OuterRef('effective_client_id')).filter(Q(name__icontains=value) | Q(dni__icontains=value))
+        ))
 
-    vendedor = django_filters.ModelChoiceFilter(
+    vendedor = django_filters.ChoiceFilter(
         field_name='transaction__vendedor',
-        queryset=Seller.objects.all(),
+        choices=model_choices(Seller),
         label='Vendedor',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
     facturador = django_filters.ChoiceFilter(
         field_name='transaction__facturador',
-        choices=lambda:  list(Transaction.objects.exclude(facturador__isnull=True).exclude(facturador__exact='').values_list('facturador', 'facturador').distinct().order_by('facturador')),
+        choices=facturador_choices,
         label='Facturador',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
@@ -234,7 +362,8 @@ class CreditFilter(django_filters.FilterSet):
     class Meta:
         model = FinancialRecord
         fields = ['fecha__gte', 'fecha__lte', 'comprobante', 'banco_llegada', 'payment_status', 
-                  'display_client', 'valor', 'uploaded_by', 'vendedor', 'facturador']
+                  'display_client', 'valor', 'valor_modo', 'valor_tolerancia', 'valor__gte', 'valor__lte',
+                  'uploaded_by', 'vendedor', 'facturador']
 
 
 class ClientFilter(django_filters.FilterSet):
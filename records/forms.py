@@ -1,14 +1,16 @@
 # records/forms.py
 
 from django import forms
-from django.forms import modelformset_factory, BaseModelFormSet
-from .models import FinancialRecord, Bank, DuplicateRecordAttempt, AccessRequest, Transaction, Seller, OrigenTransaccion, TransactionType, Client, PaymentDocument
+from django.forms import modelformset_factory, BaseModelFormSet, BaseInlineFormSet
+from .models import FinancialRecord, Bank, DuplicateRecordAttempt, AccessRequest, Transaction, Seller, OrigenTransaccion, TransactionType, Client, PaymentDocument, BankImportProfile
 import json
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.forms import UserChangeForm
 from django.utils.html import format_html
 from django.utils import timezone
 from dateutil.relativedelta import relativedelta
+from .normalization import normalize_dni
+from .services import build_duplicate_attempt, find_receipt_duplicates, record_duplicate_attempts
 
 class AccessRequestApprovalForm(forms.ModelForm):
     ACTION_CHOICES = [
@@ -91,6 +93,10 @@ class FinancialRecordForm(forms.ModelForm):
 
         # Atributo para la validación de duplicados
         self.existing_record = None
+        # Dentro de un formset la verificación de duplicados se hace en bloque en el clean() del
+        # formset (DuplicateCheckFormSetMixin); aquí solo se guarda la clave a verificar.
+        self.defer_duplicate_check = False
+        self.duplicate_check_key = None
 
     class Meta:
         model = FinancialRecord
@@ -105,6 +111,43 @@ class FinancialRecordForm(forms.ModelForm):
             }),
         }
 
+    def apply_duplicate_check(self, exact, similar_ids):
+        """
+        Aplica el resultado de find_receipt_duplicates a este formulario: error si es un duplicado
+        exacto, advertencia (o alerta al administrador, si el usuario confirmó) si es similar.
+        Devuelve el DuplicateRecordAttempt a registrar (sin guardar) o None; quien llama lo
+        registra con record_duplicate_attempts.
+        """
+        cleaned_data = self.cleaned_data
+        fecha, hora, comprobante, banco_llegada, valor = (
+            cleaned_data.get('fecha'), cleaned_data.get('hora'), cleaned_data.get('comprobante'),
+            cleaned_data.get('banco_llegada'), cleaned_data.get('valor'),
+        )
+
+        # 1. Verificación de duplicado EXACTO
+        if exact and comprobante:
+            self.add_error(None, forms.ValidationError(
+                format_html('<div id="exact-duplicate-error">Registro duplicado exacto: ya existe un registro con los mismos datos (Fecha: {}, Hora: {}, Comprobante: {}, Banco: {}, Valor: {}).</div>', fecha, hora, comprobante, banco_llegada.name, valor)
+            ))
+            if self.request:
+                return build_duplicate_attempt(cleaned_data, self.request.user, 'DUPLICATE')
+            return None
+
+        # 2. Verificación de registro SIMILAR: misma fecha, banco y valor, hora dentro de la ventana
+        if similar_ids:
+            if not cleaned_data.get('confirm_duplicate'):
+                # Si hay un duplicado similar y el usuario NO ha confirmado, mostramos la advertencia.
+                self.add_error(
+                    'confirm_duplicate',
+                    format_html('<div id=\"similar-duplicate-warning\">ADVERTENCIA: Posible registro duplicado. Ya existe un registro con la misma Fecha, Banco y Valor y una Hora muy cercana. Si estás seguro de que no es un duplicado, marca la casilla de confirmación.</div>')
+                )
+                self.similar_records = FinancialRecord.objects.filter(pk__in=similar_ids)
+            else:
+                # Si el usuario SÍ ha confirmado, creamos la alerta para el administrador.
+                if self.request:
+                    return build_duplicate_attempt(cleaned_data, self.request.user, 'SIMILAR')
+        return None
+
     def clean(self):
         cleaned_data = super().clean()
         comprobante = cleaned_data.get('comprobante')
@@ -123,64 +166,13 @@ class FinancialRecordForm(forms.ModelForm):
         banco_llegada = cleaned_data.get('banco_llegada')
         valor = cleaned_data.get('valor')
 
-        # Obtener el valor de confirm_duplicate
-        confirm_duplicate = cleaned_data.get('confirm_duplicate')
-
         # Solo realizamos estas verificaciones para nuevos registros
-        if not self.instance.pk:
-            # --- Verificación de Duplicados ---
-
-            # 1. Verificación de duplicado EXACTO
-            if fecha and hora and comprobante and banco_llegada and valor:
-                exact_qs = FinancialRecord.objects.filter(
-                    fecha=fecha,
-                    hora=hora,
-                    comprobante=comprobante,
-                    banco_llegada=banco_llegada,
-                    valor=valor
-                )
-                if exact_qs.exists():
-                    if self.request:
-                        serializable_data = {k: str(v) for k, v in cleaned_data.items()}
-                        DuplicateRecordAttempt.objects.create(
-                            user=self.request.user,
-                            data=serializable_data,
-                            attempt_type='DUPLICATE'
-                        )
-                    raise forms.ValidationError(
-                        format_html('<div id="exact-duplicate-error">Registro duplicado exacto: ya existe un registro con los mismos datos (Fecha: {}, Hora: {}, Comprobante: {}, Banco: {}, Valor: {}).</div>', fecha, hora, comprobante, banco_llegada.name, valor)
-                    )
-
-            # 2. Verificación de registro SIMILAR (más específica)
-            if fecha and hora and banco_llegada and valor:
-                similar_qs = FinancialRecord.objects.filter(
-                    fecha=fecha,
-                    hora=hora,
-                    banco_llegada=banco_llegada,
-                    valor=valor
-                )
-                
-                # Excluimos el duplicado exacto si el comprobante también está presente.
-                if comprobante:
-                    similar_qs = similar_qs.exclude(comprobante=comprobante)
-
-                if similar_qs.exists():
-                    if not confirm_duplicate:
-                        # Si hay un duplicado similar y el usuario NO ha confirmado, mostramos la advertencia.
-                        self.add_error(
-                            'confirm_duplicate',
-                            format_html('<div id=\"similar-duplicate-warning\">ADVERTENCIA: Posible registro duplicado. Ya existe un registro con la misma Fecha, Hora, Banco y Valor. Si estás seguro de que no es un duplicado, marca la casilla de confirmación.</div>')
-                        )
-                        self.similar_records = similar_qs
-                    else:
-                        # Si el usuario SÍ ha confirmado, creamos la alerta para el administrador.
-                        if self.request:
-                            serializable_data = {k: str(v) for k, v in cleaned_data.items()}
-                            DuplicateRecordAttempt.objects.create(
-                                user=self.request.user,
-                                data=serializable_data,
-                                attempt_type='SIMILAR'
-                            )
+        if not self.instance.pk and fecha and hora and banco_llegada and valor:
+            self.duplicate_check_key = (fecha, hora, cleaned_data.get('comprobante'), banco_llegada.pk, valor)
+            if not self.defer_duplicate_check:
+                attempt = self.apply_duplicate_check(*find_receipt_duplicates([self.duplicate_check_key])[0])
+                if attempt is not None:
+                    record_duplicate_attempts([attempt])
 
         # Para nuevos registros, si payment_status no se envía, establece el valor por defecto.
         if not self.instance.pk and not cleaned_data.get('payment_status'):
@@ -335,7 +327,8 @@ class ClientForm(forms.ModelForm):
     
     def clean_dni(self):
         """Validación solo para nuevos registros o ediciones"""
-        dni = self.cleaned_data.get('dni', '').strip()
+        # Misma normalización que Client.save para que la validación de unicidad compare el valor final
+        dni = normalize_dni(self.cleaned_data.get('dni', ''))
         
         if not dni:
             raise forms.ValidationError('El campo DNI es obligatorio.')
@@ -348,9 +341,44 @@ class ClientForm(forms.ModelForm):
 
 
 class CSVUploadForm(forms.Form):
-    csv_file = forms.FileField(label="Seleccionar archivo CSV", max_length=5 * 1024 * 1024) # Added max_length for file size limit
+    csv_file = forms.FileField(label="Seleccionar archivo CSV o Excel (.xlsx)", max_length=5 * 1024 * 1024) # Added max_length for file size limit
+    profile = forms.ModelChoiceField(
+        queryset=BankImportProfile.objects.select_related('bank'),
+        required=False,
+        empty_label="Plantilla estándar",
+        label="Formato del archivo",
+        help_text="Elija el perfil del banco para cargar su extracto nativo sin adaptarlo a la plantilla."
+    )
+    preview = forms.BooleanField(
+        label="Previsualizar antes de importar",
+        required=False,
+        initial=True,
+        help_text="Valida el archivo y muestra qué filas son nuevas, duplicadas o con error antes de insertarlas."
+    )
+
 
 
+class ReconciliationForm(forms.Form):
+    statement_file = forms.FileField(label="Extracto bancario (CSV o Excel .xlsx)")
+    profile = forms.ModelChoiceField(
+        queryset=BankImportProfile.objects.select_related('bank'),
+        required=False,
+        empty_label="Plantilla estándar",
+        label="Formato del extracto"
+    )
+    amount_tolerance = forms.DecimalField(
+        label="Tolerancia de valor", min_value=0, max_digits=12, decimal_places=2, initial=0,
+        help_text="Diferencia máxima permitida entre el valor del extracto y el del recibo."
+    )
+    time_tolerance = forms.IntegerField(
+        label="Tolerancia de hora (minutos)", min_value=0, initial=60,
+        help_text="Solo aplica a líneas del mismo día del recibo que traen hora."
+    )
+    auto_apply = forms.BooleanField(
+        label="Aprobar automáticamente las coincidencias seguras", required=False,
+        help_text="Las coincidencias ambiguas siempre quedan como propuesta."
+    )
+
 
 class BulkClientUploadForm(forms.Form):
     file = forms.FileField(label="Seleccionar archivo Excel o CSV")
@@ -365,8 +393,32 @@ class UserUpdateForm(forms.ModelForm):
 
 # --- New Forms for Bulk Receipt Creation ---
 
-class BaseFinancialRecordFormSet(BaseModelFormSet):
+class DuplicateCheckFormSetMixin:
+    """
+    Verifica los duplicados de todos los FinancialRecordForm del formset con una sola consulta
+    (find_receipt_duplicates) en lugar de dos consultas por formulario, y registra los intentos
+    resultantes con una sola sentencia (record_duplicate_attempts).
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.defer_duplicate_check = True
+        return form
+
+    def clean(self):
+        super().clean()
+        pending = [
+            form for form in self.forms
+            if getattr(form, 'duplicate_check_key', None) and not form.cleaned_data.get('DELETE')
+        ]
+        results = find_receipt_duplicates([form.duplicate_check_key for form in pending])
+        attempts = [form.apply_duplicate_check(*result) for form, result in zip(pending, results)]
+        record_duplicate_attempts([attempt for attempt in attempts if attempt is not None])
+
+
+class BaseFinancialRecordFormSet(DuplicateCheckFormSetMixin, BaseModelFormSet):
     def clean(self):
+        super().clean()
         if any(self.errors):
             return
         
@@ -523,6 +575,10 @@ class TransactionForm(forms.ModelForm):
         }
 
 
+class BaseFinancialRecordInlineFormSet(DuplicateCheckFormSetMixin, BaseInlineFormSet):
+    pass
+
+
 FinancialRecordFormSet = modelformset_factory(
     FinancialRecord,
     form=FinancialRecordForm,
@@ -0,0 +1,57 @@
+# records/management/commands/explain_filters.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from records.filters import CreditFilter, TransactionFilter
+from records.models import FinancialRecord, OrigenTransaccion, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el plan de consulta (EXPLAIN) de los filtros por cliente y por origen con EXISTS '
+        'frente a los JOIN + DISTINCT que reemplazaron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cliente', default='a', help='Texto a buscar en nombre o DNI del cliente (por defecto "a").')
+        parser.add_argument('--origen', type=int, help='ID del origen de transacción (por defecto, el primero).')
+        parser.add_argument('--page-size', type=int, default=50, help='Filas de la página explicada (por defecto 50).')
+        parser.add_argument('--analyze', action='store_true', help='Ejecuta las consultas (EXPLAIN ANALYZE, solo PostgreSQL).')
+
+    def handle(self, *args, **options):
+        value = options['cliente']
+        origen = options['origen'] or OrigenTransaccion.objects.order_by('pk').values_list('pk', flat=True).first()
+        client_match = Q(cliente__name__icontains=value) | Q(cliente__dni__icontains=value)
+
+        comparisons = [
+            (
+                'Transacciones por cliente',
+                Transaction.objects.filter(client_match).distinct(),
+                TransactionFilter({'cliente': value}, queryset=Transaction.objects.all()).qs,
+            ),
+            (
+                'Transacciones por origen de recibo',
+                Transaction.objects.filter(receipts__origen_transaccion=origen).distinct(),
+                TransactionFilter({'origen_transaccion': origen}, queryset=Transaction.objects.all()).qs,
+            ),
+            (
+                'Recibos por cliente',
+                FinancialRecord.objects.filter(
+                    client_match
+                    | Q(transaction__cliente__name__icontains=value) | Q(transaction__cliente__dni__icontains=value)
+                ).distinct(),
+                CreditFilter({'display_client': value}, queryset=FinancialRecord.objects.all()).qs,
+            ),
+        ]
+
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options = {'analyze': True, 'buffers': True}
+        for title, old, new in comparisons:
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for label, queryset in (('JOIN + DISTINCT', old), ('EXISTS', new)):
+                # Mismo orden y tamaño que la página de los listados
+                page = queryset.order_by('-pk')[:options['page_size']]
+                self.stdout.write(self.style.MIGRATE_LABEL(f'-- {label}'))
+                self.stdout.write(page.explain(**explain_options))
+            self.stdout.write('')
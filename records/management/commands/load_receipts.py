@@ -1,5 +1,7 @@
 # records/management/commands/load_receipts.py
 from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from records.models import BankImportProfile
 from records.services import CSVProcessor
 import os
 
@@ -7,7 +9,13 @@ class Command(BaseCommand):
     help = 'Carga recibos desde un archivo CSV usando la lógica centralizada de CSVProcessor.'
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file_path', type=str, help='La ruta al archivo CSV para cargar.')
+        parser.add_argument('csv_file_path', type=str, help='La ruta al archivo CSV o .xlsx para cargar.')
+        parser.add_argument('--username', type=str, help='Usuario al que se atribuye la carga (uploaded_by e historial).')
+        parser.add_argument('--profile', type=str, help='Nombre del perfil de importación del banco (BankImportProfile).')
+        parser.add_argument(
+            '--engine', choices=CSVProcessor.ENGINES,
+            help="Motor de inserción: 'orm' (por defecto) o 'copy' (solo PostgreSQL). En otras bases de datos siempre se usa 'orm'."
+        )
 
     def handle(self, *args, **options):
         file_path = options['csv_file_path']
@@ -16,6 +24,18 @@ class Command(BaseCommand):
         if not os.path.exists(file_path):
             raise CommandError(f'El archivo "{file_path}" no fue encontrado.')
 
+        user = None
+        if options.get('username'):
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f'El usuario "{options["username"]}" no existe.')
+
+        profile = None
+        if options.get('profile'):
+            profile = BankImportProfile.objects.select_related('bank').filter(name=options['profile']).first()
+            if profile is None:
+                raise CommandError(f'El perfil de importación "{options["profile"]}" no existe.')
+
         try:
             # Abrimos el archivo en modo binario ('rb') porque TextIOWrapper (usado dentro de CSVProcessor)
             # se encargará de la decodificación.
@@ -25,11 +45,12 @@ class Command(BaseCommand):
                 class MockUploadedFile:
                     def __init__(self, file_obj):
                         self.file = file_obj
+                        self.name = file_path  # La extensión decide entre CSV y .xlsx
 
                 mock_file = MockUploadedFile(f)
                 
                 # Delegamos todo el procesamiento a nuestra clase de servicio
-                processor = CSVProcessor(mock_file)
+                processor = CSVProcessor(mock_file, user=user, engine=options.get('engine'), profile=profile)
                 result = processor.process()
 
                 # Imprimimos los mensajes de resultado en la consola
@@ -0,0 +1,37 @@
+# records/management/commands/rebuild_receipt_counters.py
+from functools import reduce
+from operator import or_
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from records.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de recibos desnormalizados de las transacciones y corrige los desajustes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Transacciones por UPDATE (por defecto 2000).')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta las transacciones desajustadas.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        expressions = Transaction.receipt_counter_expressions()
+        # Desajustada: algún contador guardado difiere del calculado
+        drift = reduce(or_, (~Q(**{field: F(f'actual_{field}')}) for field in expressions))
+        stale_ids = list(
+            Transaction.objects.annotate(**{f'actual_{field}': expr for field, expr in expressions.items()})
+            .filter(drift).order_by('pk').values_list('pk', flat=True)
+        )
+        self.stdout.write(f'Transacciones con contadores desajustados: {len(stale_ids)}')
+
+        if not options['dry_run']:
+            batch_size = options['batch_size']
+            for start in range(0, len(stale_ids), batch_size):
+                with transaction.atomic():
+                    Transaction.refresh_receipt_counters(stale_ids[start:start + batch_size])
+            self.stdout.write(self.style.SUCCESS(f'Contadores recalculados: {len(stale_ids)}'))
+
+        self.stdout.write(f'Tiempo: {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,69 @@
+# records/management/commands/reconcile_statement.py
+from decimal import Decimal
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from records.models import BankImportProfile
+from records.reconciliation import ReconciliationEngine, statement_lines_from_parsed
+from records.services import CSVProcessor, approve_pending_receipts
+
+
+class Command(BaseCommand):
+    help = 'Concilia un extracto bancario contra los recibos pendientes y, opcionalmente, aprueba las coincidencias seguras.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement_path', type=str, help='Ruta al extracto (CSV o .xlsx).')
+        parser.add_argument('--profile', type=str, help='Nombre del perfil de importación del banco (BankImportProfile).')
+        parser.add_argument('--amount-tolerance', type=Decimal, default=Decimal('0.00'), help='Diferencia máxima de valor.')
+        parser.add_argument('--time-tolerance', type=int, default=60, help='Diferencia máxima de hora en minutos.')
+        parser.add_argument('--apply', action='store_true', help='Aprueba las coincidencias seguras.')
+        parser.add_argument('--username', type=str, help='Usuario al que se atribuyen las aprobaciones en el historial.')
+
+    def handle(self, *args, **options):
+        file_path = options['statement_path']
+        if not os.path.exists(file_path):
+            raise CommandError(f'El archivo "{file_path}" no fue encontrado.')
+
+        profile = None
+        if options.get('profile'):
+            profile = BankImportProfile.objects.select_related('bank').filter(name=options['profile']).first()
+            if profile is None:
+                raise CommandError(f'El perfil de importación "{options["profile"]}" no existe.')
+
+        user = None
+        if options.get('username'):
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f'El usuario "{options["username"]}" no existe.')
+
+        started = time.perf_counter()
+        with open(file_path, 'rb') as f:
+            class MockUploadedFile:
+                def __init__(self, file_obj):
+                    self.file = file_obj
+                    self.name = file_path
+
+            processor = CSVProcessor(MockUploadedFile(f), user=user, profile=profile)
+            statement_lines, unknown_bank_lines = statement_lines_from_parsed(processor.parse_lines())
+
+        engine = ReconciliationEngine(
+            amount_tolerance=options['amount_tolerance'],
+            time_tolerance_minutes=options['time_tolerance'],
+        ).load_statement(statement_lines)
+        matches, unmatched = engine.match()
+        confident = [m for m in matches if m.confident]
+
+        self.stdout.write(f'Líneas del extracto: {len(statement_lines)} (banco desconocido: {len(unknown_bank_lines)}, errores: {len(processor.results["line_errors"])})')
+        self.stdout.write(f'Coincidencias: {len(matches)} (seguras: {len(confident)}) | Sin coincidencia: {len(unmatched)}')
+
+        if options['apply']:
+            approved = approve_pending_receipts([m.receipt_id for m in confident], user)
+            self.stdout.write(self.style.SUCCESS(f'Recibos aprobados: {len(approved)}'))
+        else:
+            for m in matches[:50]:
+                label = 'segura' if m.confident else 'revisar'
+                self.stdout.write(f'  Línea {m.statement_line.line} -> recibo {m.receipt_id} ({label}, dif. {m.amount_difference}, {m.lag_days} días)')
+
+        self.stdout.write(f'Tiempo: {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,30 @@
+# records/management/commands/scan_duplicates.py
+from datetime import timedelta
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from records.duplicate_scan import scan_near_duplicates
+
+
+class Command(BaseCommand):
+    help = 'Escanea el histórico de recibos en busca de posibles duplicados (mismo banco y valor, hora cercana).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=120, help='Ventana de tiempo en segundos entre recibos (por defecto 120).')
+        parser.add_argument('--days', type=int, help='Solo recibos de los últimos N días (por defecto, todo el histórico).')
+        parser.add_argument('--dry-run', action='store_true', help='Cuenta los grupos sin registrar intentos.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options.get('days'):
+            since = timezone.localdate() - timedelta(days=options['days'])
+
+        started = time.perf_counter()
+        found, created = scan_near_duplicates(
+            window_seconds=options['window'], since=since, dry_run=options['dry_run']
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Grupos de posibles duplicados: {found}. Nuevos registrados: {created}. Tiempo: {elapsed:.1f}s'
+        ))
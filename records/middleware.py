@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+
+
+# Clave interna de la sesión con la fecha (epoch) en la que expira lo que ya está persistido.
+SESSION_EXPIRES_AT_KEY = '_session_expires_at'
+
+
+class SlidingSessionMiddleware:
+    """
+    Expiración deslizante de la sesión sin escribir en cada petición.
+
+    Reemplaza a SESSION_SAVE_EVERY_REQUEST: la sesión solo se marca como
+    modificada (y por tanto se persiste y se reenvía la cookie) cuando la vida
+    restante de lo ya guardado cae por debajo de SESSION_REFRESH_THRESHOLD.
+    Las peticiones intermedias (autocompletados, listados, etc.) no escriben
+    en la tabla de sesiones.
+
+    Debe ir DESPUÉS de SessionMiddleware en MIDDLEWARE, para que su respuesta
+    se procese antes de que SessionMiddleware decida si guarda la sesión.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        # is_empty() no consulta la base de datos: usuarios anónimos sin cookie no generan escrituras.
+        if session is None or session.is_empty():
+            return response
+
+        now = int(time.time())
+        expires_at = session.get(SESSION_EXPIRES_AT_KEY, 0)
+        threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', 0)
+
+        # Si la sesión ya se va a guardar (login, mensajes, etc.) aprovechamos la escritura.
+        if session.modified or expires_at - now < threshold:
+            session[SESSION_EXPIRES_AT_KEY] = now + session.get_expiry_age()
+
+        return response
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0034_alter_financialrecord_payment_document_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('PREVIEW', 'Previsualización'), ('COMMITTED', 'Importado'), ('DISCARDED', 'Descartado')], default='PREVIEW', max_length=20)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('new_count', models.PositiveIntegerField(default=0)),
+                ('duplicate_count', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('committed_at', models.DateTimeField(blank=True, null=True)),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Importación de Recibos',
+                'verbose_name_plural': 'Importaciones de Recibos',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StagedReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('NEW', 'Nuevo'), ('DUPLICATE', 'Duplicado'), ('ERROR', 'Error')], max_length=20)),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('hora', models.TimeField(blank=True, null=True)),
+                ('comprobante', models.CharField(blank=True, max_length=200)),
+                ('banco', models.CharField(blank=True, max_length=100)),
+                ('origen', models.CharField(blank=True, max_length=100)),
+                ('valor', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('raw', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='records.importbatch')),
+            ],
+            options={
+                'ordering': ['line'],
+                'indexes': [models.Index(fields=['batch', 'status', 'line'], name='records_sta_batch_i_a0bbf9_idx')],
+            },
+        ),
+    ]
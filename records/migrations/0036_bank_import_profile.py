@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0035_import_batch_staging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankImportProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nombre del perfil')),
+                ('fecha_column', models.CharField(default='FECHA', max_length=100, verbose_name='Columna de fecha')),
+                ('hora_column', models.CharField(blank=True, default='HORA', help_text='Déjela vacía si la fecha y la hora vienen en la misma columna (incluya la hora en el formato de fecha).', max_length=100, verbose_name='Columna de hora')),
+                ('comprobante_column', models.CharField(default='#COMPROBANTE', max_length=100, verbose_name='Columna de comprobante')),
+                ('valor_column', models.CharField(default='VALOR', max_length=100, verbose_name='Columna de valor')),
+                ('origen_column', models.CharField(blank=True, max_length=100, verbose_name='Columna de origen (opcional)')),
+                ('date_format', models.CharField(default='%d/%m/%Y', max_length=50, verbose_name='Formato de fecha')),
+                ('time_format', models.CharField(default='%H:%M:%S', max_length=50, verbose_name='Formato de hora')),
+                ('decimal_separator', models.CharField(choices=[(',', 'Coma (1.234,56)'), ('.', 'Punto (1,234.56)')], default=',', max_length=1, verbose_name='Separador decimal')),
+                ('sign_convention', models.CharField(choices=[('AS_IS', 'Tal cual'), ('ABSOLUTE', 'Valor absoluto'), ('INVERT', 'Invertir signo'), ('CREDITS_ONLY', 'Solo abonos (omitir valores negativos o cero)')], default='AS_IS', max_length=20, verbose_name='Convención de signo')),
+                ('skip_rows', models.PositiveSmallIntegerField(default=0, verbose_name='Filas a omitir antes de la cabecera')),
+                ('bank', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_profiles', to='records.bank', verbose_name='Banco')),
+            ],
+            options={
+                'verbose_name': 'Perfil de Importación',
+                'verbose_name_plural': 'Perfiles de Importación',
+                'ordering': ['name'],
+            },
+        ),
+    ]
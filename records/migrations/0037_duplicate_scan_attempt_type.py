@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0036_bank_import_profile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='duplicaterecordattempt',
+            name='attempt_type',
+            field=models.CharField(choices=[('DUPLICATE', 'Duplicado Exacto'), ('SIMILAR', 'Posible Duplicado (Confirmado)'), ('NEAR_DUPLICATE', 'Posible Duplicado (Escaneo Nocturno)')], default='DUPLICATE', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='duplicaterecordattempt',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:40
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_last_seen(apps, schema_editor):
+    DuplicateRecordAttempt = apps.get_model('records', 'DuplicateRecordAttempt')
+    DuplicateRecordAttempt.objects.update(last_seen=models.F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0038_financialrecord_duplicate_window_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='last_seen',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name='duplicaterecordattempt',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_resolved', False)), fields=('fingerprint', 'attempt_type'), name='unique_open_duplicate_attempt'),
+        ),
+        migrations.RunPython(set_last_seen, migrations.RunPython.noop),
+    ]
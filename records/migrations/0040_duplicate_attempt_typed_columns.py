@@ -0,0 +1,124 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:42
+
+import datetime
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _clean(value):
+    # `data` guarda str() de cada campo: los vacíos llegan como 'None'
+    value = (value or '').strip()
+    return '' if value == 'None' else value
+
+
+def _first(value):
+    # Los intentos del escaneo nocturno guardan varias horas/comprobantes separados por comas
+    return _clean(value.split(',')[0] if value else value)
+
+
+def _parse(parser, value):
+    try:
+        return parser(value) if value else None
+    except (ValueError, InvalidOperation):
+        return None
+
+
+def backfill_typed_columns(apps, schema_editor):
+    """Copia banco, fecha, hora, comprobante y valor desde `data` y calcula la huella que falte."""
+    Bank = apps.get_model('records', 'Bank')
+    DuplicateRecordAttempt = apps.get_model('records', 'DuplicateRecordAttempt')
+    bank_ids = dict(Bank.objects.values_list('name', 'pk'))
+    # Solo puede haber un intento abierto por (huella, tipo): la huella se asigna al más reciente
+    taken = set(
+        DuplicateRecordAttempt.objects.filter(is_resolved=False, fingerprint__isnull=False)
+        .values_list('fingerprint', 'attempt_type')
+    )
+
+    batch = []
+    fields = ['banco_llegada', 'fecha', 'hora', 'comprobante', 'valor', 'fingerprint']
+    for attempt in DuplicateRecordAttempt.objects.order_by('-timestamp').iterator(chunk_size=2000):
+        data = attempt.data if isinstance(attempt.data, dict) else {}
+        pick = _first if attempt.attempt_type == 'NEAR_DUPLICATE' else _clean
+        attempt.banco_llegada_id = bank_ids.get(pick(data.get('banco_llegada')).upper())
+        attempt.fecha = _parse(datetime.date.fromisoformat, pick(data.get('fecha')))
+        attempt.hora = _parse(datetime.time.fromisoformat, pick(data.get('hora')))
+        attempt.comprobante = pick(data.get('comprobante'))[:200]
+        valor = _parse(Decimal, pick(data.get('valor')))
+        attempt.valor = valor.quantize(Decimal('0.01')) if valor is not None and valor.is_finite() else None
+
+        if not attempt.fingerprint and attempt.fecha and attempt.hora and attempt.banco_llegada_id and attempt.valor is not None:
+            # Misma normalización que services.duplicate_fingerprint
+            raw = (
+                f"{attempt.fecha.isoformat()}|{attempt.hora.strftime('%H:%M:%S')}|"
+                f"{attempt.comprobante.upper()}|{attempt.banco_llegada_id}|{attempt.valor}"
+            )
+            fingerprint = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+            if attempt.is_resolved or (fingerprint, attempt.attempt_type) not in taken:
+                attempt.fingerprint = fingerprint
+                if not attempt.is_resolved:
+                    taken.add((fingerprint, attempt.attempt_type))
+
+        batch.append(attempt)
+        if len(batch) >= 1000:
+            DuplicateRecordAttempt.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        DuplicateRecordAttempt.objects.bulk_update(batch, fields)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0039_duplicate_attempt_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='banco_llegada',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicate_attempts', to='records.bank'),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='comprobante',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='hora',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='duplicaterecordattempt',
+            name='valor',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='duplicaterecordattempt',
+            index=models.Index(fields=['fecha', 'banco_llegada'], name='dupattempt_fecha_banco'),
+        ),
+        migrations.AddIndex(
+            model_name='duplicaterecordattempt',
+            index=models.Index(fields=['comprobante'], name='dupattempt_comprobante'),
+        ),
+        migrations.AddIndex(
+            model_name='duplicaterecordattempt',
+            index=models.Index(fields=['fingerprint'], name='dupattempt_fingerprint'),
+        ),
+        migrations.AddIndex(
+            model_name='duplicaterecordattempt',
+            index=models.Index(fields=['timestamp'], name='dupattempt_timestamp'),
+        ),
+        migrations.RunPython(backfill_typed_columns, migrations.RunPython.noop),
+    ]
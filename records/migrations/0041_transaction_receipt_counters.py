@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:47
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_receipt_counters(apps, schema_editor):
+    # Misma lógica que Transaction.receipt_counter_expressions (los modelos de migración no tienen sus métodos)
+    Transaction = apps.get_model('records', 'Transaction')
+    FinancialRecord = apps.get_model('records', 'FinancialRecord')
+    receipts = FinancialRecord.objects.filter(transaction=OuterRef('pk')).order_by().values('transaction')
+
+    def count(**filters):
+        return Coalesce(Subquery(receipts.filter(**filters).annotate(n=Count('pk')).values('n')), Value(0))
+
+    Transaction.objects.update(
+        receipt_count=count(),
+        approved_receipt_count=count(payment_status='Aprobado'),
+        pending_receipt_count=count(payment_status='Pendiente'),
+        rejected_receipt_count=count(payment_status='Rechazado'),
+        receipts_sum=Coalesce(
+            Subquery(receipts.annotate(total=Sum('valor')).values('total')),
+            Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0040_duplicate_attempt_typed_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='approved_receipt_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Recibos aprobados'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='pending_receipt_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Recibos pendientes'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Recibos'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipts_sum',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14, verbose_name='Total recibos'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='rejected_receipt_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Recibos rechazados'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'pending_receipt_count', 'rejected_receipt_count'], name='transaction_receipt_status'),
+        ),
+        migrations.RunPython(fill_receipt_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_effective_client(apps, schema_editor):
+    # Misma lógica que FinancialRecord.refresh_effective_client
+    FinancialRecord = apps.get_model('records', 'FinancialRecord')
+    Transaction = apps.get_model('records', 'Transaction')
+    transaction_client = Transaction.objects.filter(pk=OuterRef('transaction_id')).values('cliente_id')[:1]
+    FinancialRecord.objects.update(effective_client_id=Coalesce('cliente_id', Subquery(transaction_client)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0041_transaction_receipt_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financialrecord',
+            name='effective_client',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='effective_receipts', to='records.client', verbose_name='Cliente efectivo'),
+        ),
+        migrations.RunPython(fill_effective_client, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0042_financialrecord_effective_client'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialrecord',
+            index=models.Index(fields=['valor'], name='financialrecord_valor'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['expected_amount'], name='transaction_expected_amount'),
+        ),
+    ]
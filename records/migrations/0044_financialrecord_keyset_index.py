@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0043_amount_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='financialrecord',
+            index=models.Index(fields=['-creado', '-id'], name='financialrecord_creado_id'),
+        ),
+    ]
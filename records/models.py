@@ -1,14 +1,16 @@
-from django.db import models
+from django.db import models, connection, transaction as db_transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
 from django.contrib.auth.models import User
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from datetime import datetime
 from decimal import Decimal
 from .utils import calculate_effective_date
+from .normalization import normalize_dni, normalize_client_name
+from .pagination import invalidate_list_counts
 import secrets
-import re
 
 
 class AuthorizedUser(models.Model):
@@ -52,17 +54,10 @@ class Client(models.Model):
         return total or Decimal('0.00')
 
     def save(self, *args, **kwargs):
-        # Limpieza del campo DNI antes de guardar
-        if self.dni:
-            # Permitir solo letras, números y guiones
-            self.dni = re.sub(r"[^A-Za-z0-9\-]", "", self.dni)
-        # Limpiar nombre (permite letras y espacios)
-        if self.name:
-            # Mayúsculas
-            self.name = self.name.upper()
-
-            # Eliminar cualquier caracter que NO sea letra o espacio
-            self.name = re.sub(r"[^A-Z\s]", "", self.name)
+        # Limpieza de DNI (letras, números y guiones) y nombre (mayúsculas, letras y espacios)
+        # con las mismas reglas que usan los formularios y las cargas masivas.
+        self.dni = normalize_dni(self.dni)
+        self.name = normalize_client_name(self.name)
 
         super().save(*args, **kwargs)
 
@@ -113,6 +108,63 @@ class Bank(models.Model):
         self.name = self.name.upper()
         super(Bank, self).save(*args, **kwargs)
 
+class BankImportProfile(models.Model):
+    """
+    Perfil de importación del extracto nativo de un banco: nombres de columnas, formatos de
+    fecha/hora, separador decimal y convención de signo. CSVProcessor lo compila una vez por
+    archivo en un parser de filas (ver records.parsers.compile_row_parser).
+    """
+    DECIMAL_SEPARATOR_CHOICES = [
+        (',', 'Coma (1.234,56)'),
+        ('.', 'Punto (1,234.56)'),
+    ]
+    SIGN_CONVENTION_CHOICES = [
+        ('AS_IS', 'Tal cual'),
+        ('ABSOLUTE', 'Valor absoluto'),
+        ('INVERT', 'Invertir signo'),
+        ('CREDITS_ONLY', 'Solo abonos (omitir valores negativos o cero)'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="Nombre del perfil")
+    bank = models.ForeignKey(Bank, on_delete=models.CASCADE, related_name='import_profiles', verbose_name="Banco")
+    fecha_column = models.CharField(max_length=100, default='FECHA', verbose_name="Columna de fecha")
+    hora_column = models.CharField(
+        max_length=100, default='HORA', blank=True, verbose_name="Columna de hora",
+        help_text="Déjela vacía si la fecha y la hora vienen en la misma columna (incluya la hora en el formato de fecha)."
+    )
+    comprobante_column = models.CharField(max_length=100, default='#COMPROBANTE', verbose_name="Columna de comprobante")
+    valor_column = models.CharField(max_length=100, default='VALOR', verbose_name="Columna de valor")
+    origen_column = models.CharField(max_length=100, blank=True, verbose_name="Columna de origen (opcional)")
+    date_format = models.CharField(max_length=50, default='%d/%m/%Y', verbose_name="Formato de fecha")
+    time_format = models.CharField(max_length=50, default='%H:%M:%S', verbose_name="Formato de hora")
+    decimal_separator = models.CharField(max_length=1, choices=DECIMAL_SEPARATOR_CHOICES, default=',', verbose_name="Separador decimal")
+    sign_convention = models.CharField(max_length=20, choices=SIGN_CONVENTION_CHOICES, default='AS_IS', verbose_name="Convención de signo")
+    skip_rows = models.PositiveSmallIntegerField(default=0, verbose_name="Filas a omitir antes de la cabecera")
+
+    class Meta:
+        verbose_name = "Perfil de Importación"
+        verbose_name_plural = "Perfiles de Importación"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.bank})"
+
+    def layout(self):
+        """Parámetros para records.parsers.compile_row_parser."""
+        return {
+            'fecha_column': self.fecha_column,
+            'hora_column': self.hora_column,
+            'comprobante_column': self.comprobante_column,
+            'valor_column': self.valor_column,
+            'bank_column': None,
+            'origen_column': self.origen_column,
+            'date_format': self.date_format,
+            'time_format': self.time_format,
+            'decimal_separator': self.decimal_separator,
+            'sign_convention': self.sign_convention,
+        }
+
+
 class PaymentDocument(models.Model):
     name = models.CharField(max_length=100, unique=True)
     bank = models.ForeignKey(Bank, on_delete=models.PROTECT, verbose_name="Banco", null=True, blank=True)
@@ -148,6 +200,18 @@ class OrigenTransaccion(models.Model):
         verbose_name_plural = "Origenes de Transacción"
 
 
+class PendingReceiptCounterRefresh:
+    """Callback de on_commit que acumula las transacciones a recalcular (ver schedule_receipt_counter_refresh)."""
+
+    def __init__(self, transaction_ids):
+        self.transaction_ids = set(transaction_ids)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        Transaction.refresh_receipt_counters(self.transaction_ids)
+
+
 class Transaction(models.Model):
     STATUS_CHOICES = [
         ('Pendiente', 'Pendiente'),
@@ -167,29 +231,181 @@ class Transaction(models.Model):
     unique_transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name="ID unico")
     creat_at = models.DateTimeField(auto_now_add=True, null=True, blank=True, verbose_name="Fecha de Creación")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="transactions_created", verbose_name="Creado por")
-    history = HistoricalRecords()
+    # Contadores de recibos desnormalizados (ver refresh_receipt_counters). Se mantienen al crear,
+    # vincular, desvincular, cambiar de estado o borrar recibos; rebuild_receipt_counters corrige desajustes.
+    receipt_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Recibos")
+    approved_receipt_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Recibos aprobados")
+    pending_receipt_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Recibos pendientes")
+    rejected_receipt_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Recibos rechazados")
+    receipts_sum = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), editable=False, verbose_name="Total recibos")
+    history = HistoricalRecords(excluded_fields=[
+        'receipt_count', 'approved_receipt_count', 'pending_receipt_count', 'rejected_receipt_count', 'receipts_sum',
+    ])
+
+    RECEIPT_COUNTER_FIELDS = (
+        'receipt_count', 'approved_receipt_count', 'pending_receipt_count', 'rejected_receipt_count', 'receipts_sum',
+    )
+
+    @classmethod
+    def allocate_ids(cls, count=1):
+        """
+        Reserva `count` IDs de la secuencia de la tabla para poder armar el
+        unique_transaction_id ANTES del INSERT (una sola escritura por transacción).
+        Solo PostgreSQL tiene secuencias; en otros motores (SQLite) devuelve None.
+        """
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [cls._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _creator_initials(self):
+        """Dos primeras letras del usuario creador, sin cargar el usuario completo si no está en memoria."""
+        if not self.created_by_id:
+            return 'na' # 'no asignado' por si no hay usuario
+        if Transaction.created_by.is_cached(self):
+            username = self.created_by.username
+        else:
+            username = User.objects.filter(pk=self.created_by_id).values_list('username', flat=True).first() or ''
+        return username[:2].upper()
+
+    def build_unique_transaction_id(self, sequence):
+        """Formato MMMDDYY + usuario + secuencia (6 dígitos) + sufijo aleatorio."""
+        created_at = self.creat_at or timezone.now()
+        date_part = created_at.strftime('%b%d%y').upper()
+        sequence_part = str(sequence).zfill(6)
+        random_part = secrets.token_hex(2).upper()
+        return f"{date_part}{self._creator_initials()}{sequence_part}{random_part}"
+
+    @classmethod
+    def receipt_counter_expressions(cls):
+        """Subconsultas que calculan cada contador de recibos a partir de FinancialRecord."""
+        receipts = FinancialRecord.objects.filter(transaction=OuterRef('pk')).order_by().values('transaction')
+
+        def count(**filters):
+            return Coalesce(Subquery(receipts.filter(**filters).annotate(n=Count('pk')).values('n')), Value(0))
+
+        return {
+            'receipt_count': count(),
+            'approved_receipt_count': count(payment_status='Aprobado'),
+            'pending_receipt_count': count(payment_status='Pendiente'),
+            'rejected_receipt_count': count(payment_status='Rechazado'),
+            'receipts_sum': Coalesce(
+                Subquery(receipts.annotate(total=Sum('valor')).values('total')),
+                Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        }
+
+    @classmethod
+    def refresh_receipt_counters(cls, transaction_ids):
+        """
+        Recalcula los contadores de recibos de las transacciones indicadas con un solo UPDATE.
+        Bloquea antes las filas de las transacciones para que dos recálculos concurrentes sobre
+        la misma transacción no se pisen.
+        """
+        transaction_ids = {pk for pk in transaction_ids if pk is not None}
+        if not transaction_ids:
+            return
+        with db_transaction.atomic():
+            list(cls.objects.select_for_update().filter(pk__in=transaction_ids).values_list('pk', flat=True))
+            cls.objects.filter(pk__in=transaction_ids).update(**cls.receipt_counter_expressions())
+        # Los filtros por estado de recibos leen estos contadores
+        invalidate_list_counts(cls)
+
+    @classmethod
+    def schedule_receipt_counter_refresh(cls, transaction_ids):
+        """
+        Recalcula los contadores al confirmar la transacción de BD en curso, con un único
+        refresh_receipt_counters para todas las transacciones afectadas: guardar los recibos de
+        un formset dentro de un atomic() cuesta un recálculo, no uno por recibo. Fuera de un
+        atomic() se recalcula en el acto.
+        """
+        transaction_ids = {pk for pk in transaction_ids if pk is not None}
+        if not transaction_ids:
+            return
+        if not connection.in_atomic_block:
+            cls.refresh_receipt_counters(transaction_ids)
+            return
+        # Si ya hay un recálculo pendiente en este atomic() se le suman los ids
+        for _, callback, _ in connection.run_on_commit:
+            if isinstance(callback, PendingReceiptCounterRefresh) and not callback.done:
+                callback.transaction_ids |= transaction_ids
+                return
+        db_transaction.on_commit(PendingReceiptCounterRefresh(transaction_ids))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Cliente al cargarse: si cambia, se actualiza el cliente efectivo de sus recibos
+        instance._loaded_cliente_id = instance.__dict__.get('cliente_id')
+        return instance
 
     def save(self, *args, **kwargs):
-        # Guarda para obtener el ID si es una transaccion nueva
-        is_new = self._state.adding
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None:
+                # Los contadores solo los escribe refresh_receipt_counters: una instancia cargada
+                # antes de modificar sus recibos no debe sobrescribirlos con valores viejos.
+                kwargs['update_fields'] = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.name not in self.RECEIPT_COUNTER_FIELDS
+                ]
+            with db_transaction.atomic():
+                super().save(*args, **kwargs)
+                if self.cliente_id != getattr(self, '_loaded_cliente_id', self.cliente_id):
+                    FinancialRecord.refresh_effective_client(transaction_id=self.pk, cliente__isnull=True)
+            self._loaded_cliente_id = self.cliente_id
+            return
+        if self.unique_transaction_id:
+            return super().save(*args, **kwargs)
+
+        # Transacción nueva: intentamos reservar el ID para escribir todo en un solo INSERT
+        if self.pk is None:
+            allocated = Transaction.allocate_ids(1)
+            if allocated:
+                self.pk = allocated[0]
+                # El pk ya viene de la secuencia: evitamos el UPDATE previo que Django intenta con pk asignado
+                kwargs['force_insert'] = True
+
+        if self.pk is not None:
+            self.unique_transaction_id = self.build_unique_transaction_id(self.pk)
+            return super().save(*args, **kwargs)
+
+        # Sin secuencias (SQLite): insert para obtener el ID y luego update de solo este campo
         super().save(*args, **kwargs)
-        # Generamos el ID único solo si es una transacción nueva y bo tiene uno
-        if is_new and not self.unique_transaction_id:
-            date_part = self.creat_at.strftime('%b%d%y').upper()
-            
-            
-            user_part = 'na' # 'no asignado' por si no hay usuario
-            if self.created_by:
-                user_part = self.created_by.username[:2].upper()
-                user_part = user_part.upper()
-
-            sequence_part = str(self.id).zfill(6)
-            randon_part = secrets.token_hex(2).upper()
-
+        self.unique_transaction_id = self.build_unique_transaction_id(self.pk)
+        Transaction.objects.filter(id=self.id).update(unique_transaction_id=self.unique_transaction_id)
 
-            self.unique_transaction_id = f"{date_part}{user_part}{sequence_part}{randon_part}"
-            # Usamao .update() para guardar solo este campo y evitar un bucle
-            Transaction.objects.filter(id=self.id).update(unique_transaction_id=self.unique_transaction_id)
+    @classmethod
+    def bulk_create_with_unique_ids(cls, transactions, batch_size=None, default_user=None):
+        """
+        Variante masiva para importaciones: reserva un bloque de IDs, arma los
+        unique_transaction_id en memoria e inserta todo con bulk_create, incluyendo
+        el historial de creación. Sin secuencias (SQLite) se completa con un bulk_update.
+        """
+        pending = [t for t in transactions if t.pk is None and not t.unique_transaction_id]
+        allocated = cls.allocate_ids(len(pending)) if pending else []
+
+        with db_transaction.atomic():
+            if allocated is not None:
+                for obj, pk in zip(pending, allocated):
+                    obj.pk = pk
+                    obj.unique_transaction_id = obj.build_unique_transaction_id(pk)
+                created = cls.objects.bulk_create(transactions, batch_size=batch_size)
+            else:
+                created = cls.objects.bulk_create(transactions, batch_size=batch_size)
+                for obj in pending:
+                    obj.unique_transaction_id = obj.build_unique_transaction_id(obj.pk)
+                cls.objects.bulk_update(pending, ['unique_transaction_id'], batch_size=batch_size)
+            cls.history.bulk_history_create(created, batch_size=batch_size, default_user=default_user)
+        # bulk_create no envía post_save: se invalida a mano lo que hacen las señales de records.signals
+        from .choices import FACTURADOR_CHOICES, invalidate_filter_choices  # choices importa este módulo
+        invalidate_list_counts(cls)
+        if any(obj.facturador for obj in created):
+            invalidate_filter_choices(FACTURADOR_CHOICES)
+        return created
 
     # @property
     # def total_valor(self):
@@ -198,10 +414,9 @@ class Transaction(models.Model):
     def receipts_total(self):
         """
         Suma el valor de todos los recibos (FinancialRecord) asociados.
-        Devuelve un objeto Decimal.
+        Devuelve un objeto Decimal (contador desnormalizado receipts_sum, sin consulta).
         """
-        total = self.receipts.aggregate(valor_total=Sum('valor'))['valor_total']
-        return total or Decimal('0.00')
+        return self.receipts_sum
 
     @property
     def difference(self):
@@ -215,6 +430,12 @@ class Transaction(models.Model):
     class Meta:
         verbose_name = "Transacción"
         verbose_name_plural = "Transacciones"
+        indexes = [
+            # Cola del Facturador y filtro por estado de recibos (ver TransactionFilter.filter_receipt_status)
+            models.Index(fields=['status', 'pending_receipt_count', 'rejected_receipt_count'], name='transaction_receipt_status'),
+            # Filtro de valor exacto, por rango o con tolerancia (ver filters.filter_amount)
+            models.Index(fields=['expected_amount'], name='transaction_expected_amount'),
+        ]
 
     def __str__(self):
         return self.description if self.description else f"Transacción {self.id}"
@@ -250,7 +471,18 @@ class FinancialRecord(models.Model):
         related_name='receipts',
         verbose_name="Transacción"
     )
-    history = HistoricalRecords()
+    # Cliente mostrado del recibo: el directo o, si no tiene, el de su transacción. Se mantiene en
+    # save(), _bulk_update_receipts y al cambiar el cliente de la transacción (refresh_effective_client).
+    effective_client = models.ForeignKey(
+        Client,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='effective_receipts',
+        verbose_name="Cliente efectivo"
+    )
+    history = HistoricalRecords(excluded_fields=['effective_client'])
     creado = models.DateTimeField(auto_now_add=True)
     modificado = models.DateTimeField(auto_now=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploaded_financial_records')
@@ -272,18 +504,58 @@ class FinancialRecord(models.Model):
         verbose_name = "Registro Financiero"
         verbose_name_plural = "Registros Financieros"
         unique_together = ['fecha', 'hora', 'comprobante', 'banco_llegada', 'valor']
+        indexes = [
+            # Búsqueda por rango de hora de posibles duplicados (ver find_receipt_duplicates)
+            models.Index(fields=['banco_llegada', 'valor', 'fecha', 'hora'], name='financialrecord_dup_window'),
+            # Filtro de valor sin banco (ver filters.filter_amount)
+            models.Index(fields=['valor'], name='financialrecord_valor'),
+            # Paginación por clave del listado de recibos (ver CreditListView.keyset_ordering)
+            models.Index(fields=['-creado', '-id'], name='financialrecord_creado_id'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Transacción a la que pertenecía al cargarse: si el recibo se mueve, se recalculan ambas
+        instance._loaded_transaction_id = instance.__dict__.get('transaction_id')
+        return instance
+
+    @classmethod
+    def refresh_effective_client(cls, **filters):
+        """Recalcula effective_client de los recibos que cumplen `filters` con un solo UPDATE."""
+        transaction_client = Transaction.objects.filter(pk=OuterRef('transaction_id')).values('cliente_id')[:1]
+        invalidate_list_counts(cls)
+        return cls.objects.filter(**filters).update(
+            effective_client_id=Coalesce('cliente_id', Subquery(transaction_client))
+        )
+
+    def _effective_client_id(self):
+        """Cliente directo o el de la transacción, sin cargar la transacción si no está en memoria."""
+        if self.cliente_id or not self.transaction_id:
+            return self.cliente_id
+        if FinancialRecord.transaction.is_cached(self):
+            return self.transaction.cliente_id
+        return Transaction.objects.filter(pk=self.transaction_id).values_list('cliente_id', flat=True).first()
+
+    def save(self, *args, **kwargs):
+        self.effective_client_id = self._effective_client_id()
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'effective_client'}
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            Transaction.schedule_receipt_counter_refresh(
+                {self.transaction_id, getattr(self, '_loaded_transaction_id', None)}
+            )
+        self._loaded_transaction_id = self.transaction_id
 
     def display_client(self):
         """
         Retorna el cliente asociado al recibo.
         Si el recibo tiene un cliente directo (es un abono), lo retorna.
         Si el recibo está asociado a una transacción, retorna el cliente de esa transacción.
+        Lee la columna desnormalizada effective_client (una sola relación, sin pasar por la transacción).
         """
-        if self.cliente:
-            return self.cliente
-        elif self.transaction and self.transaction.cliente:
-            return self.transaction.cliente
-        return "N/A" # O puedes retornar None o una cadena vacía si prefieres
+        return self.effective_client or "N/A" # O puedes retornar None o una cadena vacía si prefieres
 
 
     def __str__(self):
@@ -323,19 +595,110 @@ class DuplicateRecordAttempt(models.Model):
     ATTEMPT_TYPE_CHOICES = [
         ('DUPLICATE', 'Duplicado Exacto'),
         ('SIMILAR', 'Posible Duplicado (Confirmado)'),
+        ('NEAR_DUPLICATE', 'Posible Duplicado (Escaneo Nocturno)'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Vacío para los hallazgos del escaneo nocturno (no los genera un usuario)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Primera vez que se detectó el intento; last_seen, la más reciente
     timestamp = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
     data = models.JSONField()
     is_resolved = models.BooleanField(default=False)
     resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='resolved_attempts')
     resolved_at = models.DateTimeField(null=True, blank=True)
     attempt_type = models.CharField(max_length=20, choices=ATTEMPT_TYPE_CHOICES, default='DUPLICATE') # Nuevo campo
+    # Huella normalizada del recibo (ver services.duplicate_fingerprint). Los intentos sin resolver
+    # con la misma huella y tipo se agrupan en una sola fila y se cuentan en `occurrences`.
+    fingerprint = models.CharField(max_length=40, null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    # Copia tipada de los datos clave del recibo (en `data` van como texto) para filtrar con índices
+    banco_llegada = models.ForeignKey(Bank, on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicate_attempts')
+    fecha = models.DateField(null=True, blank=True)
+    hora = models.TimeField(null=True, blank=True)
+    comprobante = models.CharField(max_length=200, blank=True, default='')
+    valor = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fingerprint', 'attempt_type'],
+                condition=Q(is_resolved=False),
+                name='unique_open_duplicate_attempt',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'banco_llegada'], name='dupattempt_fecha_banco'),
+            models.Index(fields=['comprobante'], name='dupattempt_comprobante'),
+            models.Index(fields=['fingerprint'], name='dupattempt_fingerprint'),
+            models.Index(fields=['timestamp'], name='dupattempt_timestamp'),
+        ]
 
     def __str__(self):
         return f"{self.get_attempt_type_display()} by {self.user} at {self.timestamp}"
 
+class ImportBatch(models.Model):
+    """
+    Carga masiva de recibos en modo previsualización. Las filas parseadas quedan en
+    StagedReceipt hasta que un administrador confirma (o descarta) la importación.
+    """
+    STATUS_CHOICES = [
+        ('PREVIEW', 'Previsualización'),
+        ('COMMITTED', 'Importado'),
+        ('DISCARDED', 'Descartado'),
+    ]
+
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='import_batches')
+    file_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PREVIEW')
+    processed = models.PositiveIntegerField(default=0)
+    new_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    committed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Importación de Recibos"
+        verbose_name_plural = "Importaciones de Recibos"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
+
+
+class StagedReceipt(models.Model):
+    """Fila de un archivo en previsualización, ya parseada, validada y clasificada."""
+    STATUS_CHOICES = [
+        ('NEW', 'Nuevo'),
+        ('DUPLICATE', 'Duplicado'),
+        ('ERROR', 'Error'),
+    ]
+
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name='rows')
+    line = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    fecha = models.DateField(null=True, blank=True)
+    hora = models.TimeField(null=True, blank=True)
+    comprobante = models.CharField(max_length=200, blank=True)
+    # Banco y origen se guardan por nombre: la previsualización no crea catálogos.
+    banco = models.CharField(max_length=100, blank=True)
+    origen = models.CharField(max_length=100, blank=True)
+    valor = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    raw = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['line']
+        indexes = [
+            models.Index(fields=['batch', 'status', 'line']),
+        ]
+
+    def __str__(self):
+        return f"Línea {self.line} ({self.get_status_display()})"
+
+
 class AccessRequest(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     approved = models.BooleanField(default=False)
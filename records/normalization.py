@@ -0,0 +1,40 @@
+import re
+from functools import lru_cache
+
+# Patrones precompilados: se comparten entre Client.save, formularios, cargas masivas y búsquedas.
+DNI_INVALID_CHARS = re.compile(r"[^A-Za-z0-9\-]")      # DNI: solo letras, números y guiones
+NAME_INVALID_CHARS = re.compile(r"[^A-Z\s]")          # Nombre (ya en mayúsculas): solo letras y espacios
+
+
+@lru_cache(maxsize=4096)
+def normalize_dni(value):
+    """Limpia un DNI dejando solo letras, números y guiones."""
+    if not value:
+        return value
+    return DNI_INVALID_CHARS.sub("", str(value).strip())
+
+
+@lru_cache(maxsize=4096)
+def normalize_client_name(value):
+    """Pasa el nombre a mayúsculas y elimina todo lo que no sea letra o espacio."""
+    if not value:
+        return value
+    return NAME_INVALID_CHARS.sub("", str(value).upper()).strip()
+
+
+def _as_str_series(values):
+    import pandas as pd
+
+    if not isinstance(values, pd.Series):
+        values = pd.Series(values)
+    return values.astype(str)
+
+
+def normalize_dni_series(values):
+    """Versión vectorizada de normalize_dni para Series/arrays de pandas."""
+    return _as_str_series(values).str.strip().str.replace(DNI_INVALID_CHARS, "", regex=True)
+
+
+def normalize_client_name_series(values):
+    """Versión vectorizada de normalize_client_name para Series/arrays de pandas."""
+    return _as_str_series(values).str.upper().str.replace(NAME_INVALID_CHARS, "", regex=True).str.strip()
@@ -0,0 +1,277 @@
+import datetime
+import hashlib
+import json
+import math
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from .utils import cache_is_shared
+
+CURSOR_PARAM = 'cursor'
+CURSOR_SALT = 'records.pagination.cursor'
+COUNT_CACHE_PREFIX = 'list-count'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder recorta los microsegundos: la clave del cursor debe ser exacta."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorSerializer:
+    """JSONSerializer de django.core.signing que admite fechas y decimales en las claves."""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), cls=CursorEncoder).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+def _generation_key(model):
+    return f'{COUNT_CACHE_PREFIX}:gen:{model._meta.label_lower}'
+
+
+def invalidate_list_counts(*models):
+    """
+    Descarta los totales cacheados de los listados de esos modelos. Se llama en cada escritura
+    sobre su tabla: save()/delete() vía records.signals y, a mano, en las operaciones masivas
+    (.update(), bulk_create, SQL directo), que no disparan señales.
+    """
+    def bump():
+        for model in models:
+            key = _generation_key(model)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+    # Tras el commit: antes, otra petición podría volver a cachear el total sin la escritura
+    transaction.on_commit(bump)
+
+
+def _count_cache_key(queryset):
+    # La SQL compilada normaliza filtros, restricciones por rol y orden de los parámetros GET
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f'{sql}|{params!r}'.encode('utf-8')).hexdigest()
+    generation = cache.get(_generation_key(queryset.model), 0)
+    return f'{COUNT_CACHE_PREFIX}:{queryset.model._meta.label_lower}:{generation}:{digest}'
+
+
+def supports_planner_estimate(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def planner_estimate(queryset):
+    """Filas estimadas por el planificador de PostgreSQL para el queryset (sin ejecutarlo)."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def cached_count(queryset):
+    """
+    Total de un listado filtrado como (total, es_estimado).
+
+    Se cachea LIST_COUNT_CACHE_TTL segundos por la SQL del queryset y la generación de su
+    tabla (ver invalidate_list_counts). En PostgreSQL se cuenta primero con un LIMIT de
+    LIST_COUNT_ESTIMATE_THRESHOLD + 1 filas: por debajo del umbral el total es exacto; por
+    encima se usa la estimación del planificador en lugar de un COUNT(*) completo.
+    Sin caché compartida solo se cachean las estimaciones: los totales exactos se cuentan
+    en cada petición, porque la invalidación no llegaría a los demás workers.
+    """
+    try:
+        key = _count_cache_key(queryset)
+    except EmptyResultSet:
+        return 0, False
+    result = cache.get(key)
+    if result is None:
+        threshold = settings.LIST_COUNT_ESTIMATE_THRESHOLD
+        if threshold and supports_planner_estimate(queryset):
+            count = queryset.order_by()[:threshold + 1].count()
+            result = (max(planner_estimate(queryset), count), True) if count > threshold else (count, False)
+        else:
+            result = (queryset.count(), False)
+        # Sin caché compartida un total exacto cacheado quedaría desactualizado en otros workers
+        if result[1] or cache_is_shared():
+            cache.set(key, result, settings.LIST_COUNT_CACHE_TTL)
+    return result
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator con el total de cached_count. Si el total es estimado no se rechazan páginas
+    posteriores a num_pages ni se recorta la última página.
+    """
+
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        count, self.count_is_estimate = cached_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.count_is_estimate):
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class KeysetPaginator:
+    """Lo mínimo de django.core.paginator.Paginator que usan las plantillas (count y num_pages)."""
+
+    def __init__(self, count, per_page, count_is_estimate=False):
+        self.count = count
+        self.per_page = per_page
+        self.count_is_estimate = count_is_estimate
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+
+class KeysetPage:
+    """Página obtenida por cursor. previous_cursor / next_cursor se pasan en ?cursor=."""
+
+    def __init__(self, object_list, paginator, number, previous_cursor, next_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+class PaginationParamsMixin:
+    """Añade al contexto `pagination_params`: los parámetros GET sin page ni cursor."""
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Parámetros GET sin paginación, para construir los enlaces Anterior/Siguiente
+        params = self.request.GET.copy()
+        params.pop(CURSOR_PARAM, None)
+        params.pop('page', None)
+        context['pagination_params'] = params.urlencode()
+        return context
+
+
+class KeysetPaginationMixin(PaginationParamsMixin):
+    """
+    Paginación por clave (seek) para ListView/FilterView.
+
+    En lugar de OFFSET, cada página continúa desde la clave de orden de la última fila vista
+    (`keyset_ordering`, terminada en una columna única), así que la página N cuesta lo mismo
+    que la primera. El cursor es opaco y firmado: guarda la clave, la dirección y el número de
+    página. El total sale de cached_count.
+    """
+
+    keyset_ordering = ('-id',)
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def _keyset_fields(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.get_keyset_ordering()]
+
+    def _seek_filter(self, values, forward):
+        # (a, b) "después de" (x, y) en orden descendente: a < x OR (a = x AND b < y)
+        conditions = []
+        fields = self._keyset_fields()
+        for position, (name, descending) in enumerate(fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            equal = {prev_name: values[i] for i, (prev_name, _) in enumerate(fields[:position])}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': values[position]}))
+        return reduce(or_, conditions)
+
+    def _make_cursor(self, obj, forward, number):
+        values = [getattr(obj, name) for name, _ in self._keyset_fields()]
+        return signing.dumps(
+            {'k': values, 'f': int(forward), 'p': number},
+            salt=CURSOR_SALT, serializer=CursorSerializer, compress=True,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        raw_cursor = self.request.GET.get(CURSOR_PARAM)
+        cursor = None
+        if raw_cursor:
+            try:
+                cursor = signing.loads(raw_cursor, salt=CURSOR_SALT, serializer=CursorSerializer)
+            except signing.BadSignature:
+                raise Http404('Cursor de paginación inválido.')
+
+        count, count_is_estimate = cached_count(queryset)
+        ordering = self.get_keyset_ordering()
+        forward = not cursor or bool(cursor['f'])
+        number = cursor['p'] if cursor else 1
+        if forward:
+            queryset = queryset.order_by(*ordering)
+        else:
+            queryset = queryset.order_by(*(f[1:] if f.startswith('-') else f'-{f}' for f in ordering))
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(cursor['k'], forward))
+
+        # Una fila de más indica si hay otra página en la dirección recorrida
+        rows = list(queryset[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        has_previous = number > 1 if forward else more
+        has_next = more if forward else True
+        previous_cursor = next_cursor = None
+        if rows and has_previous:
+            previous_cursor = self._make_cursor(rows[0], False, number - 1)
+        if rows and has_next:
+            next_cursor = self._make_cursor(rows[-1], True, number + 1)
+
+        paginator = KeysetPaginator(count, page_size, count_is_estimate)
+        page = KeysetPage(rows, paginator, number, previous_cursor, next_cursor)
+        return paginator, page, rows, page.has_other_pages()
@@ -0,0 +1,168 @@
+from datetime import date, datetime, time as datetime_time
+from decimal import Decimal
+
+# Formatos de la plantilla estándar de carga (download_csv_template)
+DEFAULT_DATE_FORMAT = '%d/%m/%Y'
+DEFAULT_TIME_FORMAT = '%H:%M:%S'
+
+# Columnas de la plantilla estándar. El banco viene en el propio archivo.
+DEFAULT_LAYOUT = {
+    'fecha_column': 'FECHA',
+    'hora_column': 'HORA',
+    'comprobante_column': '#COMPROBANTE',
+    'valor_column': 'VALOR',
+    'bank_column': 'BANCO LLEGADA',
+    'origen_column': 'ORIGEN TRANSACCION',
+    'date_format': DEFAULT_DATE_FORMAT,
+    'time_format': DEFAULT_TIME_FORMAT,
+    'decimal_separator': None,  # Plantilla: acepta '1.5' y '1,5' (sin separador de miles)
+    'sign_convention': 'AS_IS',
+}
+
+def cell_to_str(value):
+    # Comprobantes numéricos en Excel llegan como float (ej: 12345.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def cell_to_date(value, fmt=DEFAULT_DATE_FORMAT):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value.strip(), fmt).date()
+
+
+def cell_to_time(value, fmt=DEFAULT_TIME_FORMAT):
+    if isinstance(value, datetime):
+        return value.time()
+    if isinstance(value, datetime_time):
+        return value
+    return datetime.strptime(value.strip(), fmt).time()
+
+
+def cell_to_datetime(value, fmt):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime_time())
+    return datetime.strptime(value.strip(), fmt)
+
+
+def cell_to_float(value):
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    return float(value.strip().replace(',', '.'))
+
+
+def _amount_converter(decimal_separator):
+    """Conversor de importes para un separador decimal dado (None = regla de la plantilla)."""
+    if decimal_separator is None:
+        return cell_to_float
+
+    thousands_separator = '.' if decimal_separator == ',' else ','
+
+    def to_float(value):
+        if isinstance(value, (int, float, Decimal)):
+            return float(value)
+        text = value.strip().replace('$', '').replace(' ', '').replace(thousands_separator, '')
+        negative = False
+        # Negativos contables: (1.000,00) o 1.000,00-
+        if text.startswith('(') and text.endswith(')'):
+            text, negative = text[1:-1], True
+        elif text.endswith('-'):
+            text, negative = text[:-1], True
+        amount = float(text.replace(decimal_separator, '.'))
+        return -amount if negative else amount
+
+    return to_float
+
+
+def _sign_converter(sign_convention):
+    """Aplica la convención de signo del banco. Devuelve None para filas que deben omitirse."""
+    if sign_convention == 'ABSOLUTE':
+        return abs
+    if sign_convention == 'INVERT':
+        return lambda amount: -amount
+    if sign_convention == 'CREDITS_ONLY':
+        return lambda amount: amount if amount > 0 else None
+    return None
+
+
+def required_columns(layout):
+    """Columnas que deben existir en la cabecera para un layout dado."""
+    columns = [layout['fecha_column'], layout['comprobante_column'], layout['valor_column']]
+    if layout.get('hora_column'):
+        columns.insert(1, layout['hora_column'])
+    if layout.get('bank_column'):
+        columns.append(layout['bank_column'])
+    return columns
+
+
+def compile_row_parser(header_map, default_origen, bank_name=None, **layout):
+    """
+    Compila un layout (plantilla estándar o BankImportProfile) en una función parse(row).
+
+    Los índices de columna, formatos y conversores se resuelven una sola vez aquí; la función
+    resultante no consulta diccionarios ni ramifica por nombre de campo en cada fila.
+    parse(row) devuelve un diccionario de valores planos (banco y origen por nombre) o None
+    si la convención de signo indica que la fila debe omitirse (p.ej. débitos).
+    """
+    fecha_index = header_map[layout['fecha_column'].upper()]
+    comprobante_index = header_map[layout['comprobante_column'].upper()]
+    valor_index = header_map[layout['valor_column'].upper()]
+    date_format = layout.get('date_format') or DEFAULT_DATE_FORMAT
+    time_format = layout.get('time_format') or DEFAULT_TIME_FORMAT
+    to_amount = _amount_converter(layout.get('decimal_separator'))
+    apply_sign = _sign_converter(layout.get('sign_convention'))
+
+    if layout.get('hora_column'):
+        hora_index = header_map[layout['hora_column'].upper()]
+
+        def parse_fecha_hora(row):
+            return cell_to_date(row[fecha_index], date_format), cell_to_time(row[hora_index], time_format)
+    else:
+        # Fecha y hora en la misma columna (date_format incluye la hora)
+        def parse_fecha_hora(row):
+            moment = cell_to_datetime(row[fecha_index], date_format)
+            return moment.date(), moment.time()
+
+    if bank_name:
+        bank_name = bank_name.upper()
+
+        def parse_bank(row):
+            return bank_name
+    else:
+        bank_index = header_map[layout['bank_column'].upper()]
+
+        def parse_bank(row):
+            return cell_to_str(row[bank_index]).upper()
+
+    origen_column = (layout.get('origen_column') or '').upper()
+    if origen_column in header_map:
+        origen_index = header_map[origen_column]
+
+        def parse_origen(row):
+            return cell_to_str(row[origen_index]).upper() or default_origen
+    else:
+        def parse_origen(row):
+            return default_origen
+
+    def parse(row):
+        fecha, hora = parse_fecha_hora(row)
+        valor = to_amount(row[valor_index])
+        if apply_sign is not None:
+            valor = apply_sign(valor)
+            if valor is None:
+                return None
+        return {
+            'fecha': fecha,
+            'hora': hora,
+            'comprobante': cell_to_str(row[comprobante_index]),
+            'banco_llegada': parse_bank(row),
+            'valor': valor,
+            'origen_transaccion': parse_origen(row),
+        }
+
+    return parse
@@ -0,0 +1,162 @@
+from collections import defaultdict, namedtuple
+from datetime import timedelta, time as datetime_time
+from decimal import Decimal
+from functools import lru_cache
+
+from django.db.models import Max
+
+from .models import Bank, FinancialRecord, OrigenTransaccion
+from .utils import calculate_effective_date
+
+# Línea de extracto ya parseada (ver CSVProcessor.parse_lines) con el banco resuelto a id
+StatementLine = namedtuple('StatementLine', ['line', 'bank_id', 'fecha', 'hora', 'valor', 'comprobante'])
+
+# Recibo pendiente emparejado con una línea de extracto. `confident` indica que la pareja no es
+# ambigua (coincide el comprobante, o ambos lados tenían un único candidato).
+ReconciliationMatch = namedtuple(
+    'ReconciliationMatch', ['receipt_id', 'statement_line', 'amount_difference', 'lag_days', 'confident']
+)
+
+MIDNIGHT = datetime_time(0, 0)
+
+
+@lru_cache(maxsize=4096)
+def _settlement_date(fecha, dias_efectivo):
+    # calculate_effective_date recorre festivos día a día: se cachea por (fecha, días)
+    return calculate_effective_date(fecha, dias_efectivo)
+
+
+def _to_cents(valor):
+    return int((Decimal(str(valor)) * 100).to_integral_value())
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def statement_lines_from_parsed(parsed_rows):
+    """
+    Convierte las filas de CSVProcessor.parse_lines en StatementLine resolviendo los bancos
+    por nombre con una sola consulta. Las filas de bancos desconocidos se devuelven aparte.
+    """
+    parsed_rows = list(parsed_rows)
+    bank_ids = dict(
+        Bank.objects.filter(name__in={data['banco_llegada'] for _, data in parsed_rows}).values_list('name', 'pk')
+    )
+    lines, unknown_bank = [], []
+    for line, data in parsed_rows:
+        bank_id = bank_ids.get(data['banco_llegada'])
+        if bank_id is None:
+            unknown_bank.append(line)
+            continue
+        lines.append(StatementLine(
+            line, bank_id, data['fecha'], data['hora'],
+            Decimal(str(data['valor'])).quantize(Decimal('0.01')), data['comprobante'],
+        ))
+    return lines, unknown_bank
+
+
+class ReconciliationEngine:
+    """
+    Concilia líneas de extracto bancario contra recibos pendientes.
+
+    Las líneas se indexan en un diccionario por (banco, fecha, cubeta de valor), con cubetas del
+    ancho de la tolerancia de valor: cada recibo solo consulta sus 3 cubetas vecinas en cada día
+    de su ventana de liquidación (de su fecha a la fecha efectiva según
+    OrigenTransaccion.dias_efectivo). Así el coste es lineal en recibos + líneas.
+
+    Reglas de emparejamiento:
+    - mismo banco y |valor línea - valor recibo| <= amount_tolerance;
+    - la fecha de la línea cae dentro de la ventana de liquidación del recibo;
+    - si la línea es del mismo día y trae hora (no medianoche), la diferencia de hora no puede
+      superar time_tolerance_minutes.
+    Se prioriza la coincidencia de comprobante, luego la menor diferencia de valor, de días y de hora,
+    y la asignación es uno a uno.
+    """
+
+    def __init__(self, amount_tolerance=Decimal('0.00'), time_tolerance_minutes=60):
+        self.amount_tolerance = _to_cents(amount_tolerance)
+        self.bucket_width = max(self.amount_tolerance, 1)
+        self.time_tolerance = time_tolerance_minutes * 60
+        self.index = defaultdict(list)
+        self.lines = []
+
+    def _bucket(self, cents):
+        return cents // self.bucket_width
+
+    def load_statement(self, statement_lines):
+        for statement_line in statement_lines:
+            cents = _to_cents(statement_line.valor)
+            self.index[(statement_line.bank_id, statement_line.fecha, self._bucket(cents))].append((cents, statement_line))
+            self.lines.append(statement_line)
+        return self
+
+    def pending_receipts(self):
+        """Recibos pendientes que podrían liquidarse en alguna de las fechas del extracto."""
+        if not self.lines:
+            return []
+        max_dias = OrigenTransaccion.objects.aggregate(max_dias=Max('dias_efectivo'))['max_dias'] or 0
+        # Días hábiles -> días naturales, con margen para fines de semana y festivos
+        lookback = timedelta(days=max_dias * 2 + 7)
+        return FinancialRecord.objects.filter(
+            payment_status='Pendiente',
+            banco_llegada_id__in={line.bank_id for line in self.lines},
+            fecha__range=(min(line.fecha for line in self.lines) - lookback, max(line.fecha for line in self.lines)),
+        ).values_list(
+            'pk', 'banco_llegada_id', 'fecha', 'hora', 'valor', 'comprobante', 'origen_transaccion__dias_efectivo'
+        ).iterator(chunk_size=2000)
+
+    def _candidates(self, receipt):
+        receipt_id, bank_id, fecha, hora, valor, comprobante, dias_efectivo = receipt
+        cents = _to_cents(valor)
+        bucket = self._bucket(cents)
+        settle_until = _settlement_date(fecha, dias_efectivo or 0)
+        day = fecha
+        while day <= settle_until:
+            for probe in (bucket - 1, bucket, bucket + 1):
+                for line_cents, statement_line in self.index.get((bank_id, day, probe), ()):
+                    difference = abs(line_cents - cents)
+                    if difference > self.amount_tolerance:
+                        continue
+                    time_difference = 0
+                    if day == fecha and statement_line.hora and statement_line.hora != MIDNIGHT:
+                        time_difference = abs(_seconds(statement_line.hora) - _seconds(hora))
+                        if time_difference > self.time_tolerance:
+                            continue
+                    same_comprobante = bool(comprobante) and statement_line.comprobante == comprobante
+                    score = (0 if same_comprobante else 1, difference, (day - fecha).days, time_difference)
+                    yield score, receipt_id, statement_line
+            day += timedelta(days=1)
+
+    def match(self, receipts=None):
+        """
+        Empareja las líneas cargadas con los recibos (por defecto, pending_receipts()).
+        Devuelve (matches, líneas sin emparejar).
+        """
+        if receipts is None:
+            receipts = self.pending_receipts()
+
+        candidates = []
+        per_line = defaultdict(int)
+        per_receipt = defaultdict(int)
+        for receipt in receipts:
+            for score, receipt_id, statement_line in self._candidates(receipt):
+                candidates.append((score, receipt_id, statement_line))
+                per_line[statement_line.line] += 1
+                per_receipt[receipt_id] += 1
+
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[2].line, candidate[1]))
+        matches = []
+        used_lines, used_receipts = set(), set()
+        for score, receipt_id, statement_line in candidates:
+            if receipt_id in used_receipts or statement_line.line in used_lines:
+                continue
+            used_receipts.add(receipt_id)
+            used_lines.add(statement_line.line)
+            confident = score[0] == 0 or (per_line[statement_line.line] == 1 and per_receipt[receipt_id] == 1)
+            matches.append(ReconciliationMatch(
+                receipt_id, statement_line, Decimal(score[1]) / 100, score[2], confident
+            ))
+
+        unmatched = [line for line in self.lines if line.line not in used_lines]
+        return matches, unmatched
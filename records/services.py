@@ -1,90 +1,632 @@
+import codecs
 import csv
+import hashlib
+import io
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import time as datetime_time
 from io import TextIOWrapper
-from datetime import datetime
-from django.db import transaction, IntegrityError
-from .models import FinancialRecord, Bank, OrigenTransaccion, Client
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+from .models import FinancialRecord, Bank, OrigenTransaccion, Client, ImportBatch, StagedReceipt, DuplicateRecordAttempt, Transaction
 from decimal import Decimal
+from .normalization import normalize_dni_series, normalize_client_name_series
+from .choices import invalidate_filter_choices
+from .pagination import invalidate_list_counts
+from .parsers import DEFAULT_LAYOUT, cell_to_str, compile_row_parser, required_columns
+
+def _bulk_update_receipts(receipts, user, **changes):
+    """
+    Aplica `changes` a los recibos con un único UPDATE y registra su historial con
+    un único bulk_create, en lugar de un save() (UPDATE + INSERT de historial) por recibo.
+    """
+    if not receipts:
+        return 0
+    now = timezone.now()
+    changes['modificado'] = now # .update() no dispara auto_now
+    affected_transactions = {r.transaction_id for r in receipts}
+    FinancialRecord.objects.filter(pk__in=[r.pk for r in receipts]).update(**changes)
+    for receipt in receipts:
+        for field, value in changes.items():
+            setattr(receipt, field, value)
+        affected_transactions.add(receipt.transaction_id)
+    if 'cliente_id' in changes or 'transaction_id' in changes:
+        FinancialRecord.refresh_effective_client(pk__in=[r.pk for r in receipts])
+    FinancialRecord.history.bulk_history_create(receipts, update=True, default_user=user, default_date=now)
+    Transaction.schedule_receipt_counter_refresh(affected_transactions)
+    invalidate_list_counts(FinancialRecord)
+    return len(receipts)
+
+
+def apply_credits_to_transaction(transaction_obj, credit_ids, user):
+    """
+    Asocia a la transacción los abonos seleccionados que pertenecen a su cliente
+    y que no están en ninguna otra transacción. Número constante de consultas.
+    """
+    with transaction.atomic():
+        credits = list(FinancialRecord.objects.select_for_update().filter(
+            pk__in=credit_ids,
+            cliente_id=transaction_obj.cliente_id,
+            transaction__isnull=True,
+        ))
+        return _bulk_update_receipts(credits, user, transaction_id=transaction_obj.pk)
+
+
+def unlink_receipts_from_transaction(transaction_obj, receipt_ids, user):
+    """
+    Desvincula recibos de la transacción. Cada recibo conserva como cliente directo
+    el cliente de la transacción, para que quede disponible como abono.
+    """
+    with transaction.atomic():
+        receipts = list(FinancialRecord.objects.select_for_update().filter(
+            pk__in=receipt_ids,
+            transaction_id=transaction_obj.pk,
+        ))
+        return _bulk_update_receipts(receipts, user, cliente_id=transaction_obj.cliente_id, transaction_id=None)
+
+
+# Resultado por id de las acciones en bloque (set_receipts_status, resolve_duplicate_attempts)
+BULK_UPDATED = 'updated'
+BULK_UNCHANGED = 'unchanged'  # Ya estaba en el estado pedido
+BULK_SKIPPED = 'skipped'  # Su estado actual no admite el cambio
+BULK_NOT_FOUND = 'not_found'
+
+
+def set_receipts_status(receipt_ids, new_status, user, from_statuses=None):
+    """
+    Cambia el estado de pago de varios recibos con un UPDATE y un INSERT de historial.
+    Con `from_statuses`, solo cambia los recibos cuyo estado actual está en la lista.
+    Devuelve {id: resultado} para cada id pedido (ver BULK_*).
+    """
+    outcomes = dict.fromkeys(receipt_ids, BULK_NOT_FOUND)
+    with transaction.atomic():
+        receipts = list(FinancialRecord.objects.select_for_update().filter(pk__in=outcomes))
+        to_update = []
+        for receipt in receipts:
+            if receipt.payment_status == new_status:
+                outcomes[receipt.pk] = BULK_UNCHANGED
+            elif from_statuses is not None and receipt.payment_status not in from_statuses:
+                outcomes[receipt.pk] = BULK_SKIPPED
+            else:
+                outcomes[receipt.pk] = BULK_UPDATED
+                to_update.append(receipt)
+        _bulk_update_receipts(to_update, user, payment_status=new_status)
+    return outcomes
+
+
+def approve_pending_receipts(receipt_ids, user):
+    """
+    Aprueba en bloque los recibos indicados que sigan en estado Pendiente (un UPDATE y un
+    INSERT de historial). Devuelve la lista de ids realmente aprobados.
+    """
+    outcomes = set_receipts_status(receipt_ids, 'Aprobado', user, from_statuses=['Pendiente'])
+    return [pk for pk, outcome in outcomes.items() if outcome == BULK_UPDATED]
+
+
+def resolve_duplicate_attempts(attempt_ids, user):
+    """
+    Marca como resueltos varios intentos de duplicado con un solo UPDATE.
+    Devuelve {id: resultado} para cada id pedido (ver BULK_*).
+    """
+    outcomes = dict.fromkeys(attempt_ids, BULK_NOT_FOUND)
+    with transaction.atomic():
+        current = dict(
+            DuplicateRecordAttempt.objects.select_for_update()
+            .filter(pk__in=outcomes).values_list('pk', 'is_resolved')
+        )
+        to_resolve = []
+        for pk, is_resolved in current.items():
+            outcomes[pk] = BULK_UNCHANGED if is_resolved else BULK_UPDATED
+            if not is_resolved:
+                to_resolve.append(pk)
+        DuplicateRecordAttempt.objects.filter(pk__in=to_resolve).update(
+            is_resolved=True, resolved_by=user, resolved_at=timezone.now()
+        )
+        invalidate_list_counts(DuplicateRecordAttempt)
+    return outcomes
+
+
+def _time_window(hora, tolerance_seconds):
+    """Rango [hora - tolerancia, hora + tolerancia] acotado al mismo día."""
+    seconds = hora.hour * 3600 + hora.minute * 60 + hora.second
+    low = max(0, seconds - tolerance_seconds)
+    high = min(86399, seconds + tolerance_seconds)
+    return (
+        datetime_time(low // 3600, low % 3600 // 60, low % 60),
+        datetime_time(high // 3600, high % 3600 // 60, high % 60, 999999),
+    )
+
+
+def find_receipt_duplicates(candidates, tolerance_seconds=None):
+    """
+    Busca en una sola consulta los duplicados de varios recibos (p.ej. todo un formset).
+
+    `candidates` es una lista de tuplas (fecha, hora, comprobante, banco_llegada_id, valor).
+    Devuelve, por candidato y en el mismo orden, una tupla (exacto, ids_similares):
+    - exacto: ya existe un recibo con la misma clave única.
+    - ids_similares: recibos con la misma fecha, banco y valor cuya hora difiere como mucho
+      `tolerance_seconds` (SIMILAR_DUPLICATE_TOLERANCE_SECONDS), excluyendo el exacto.
+    Cada rango de hora se resuelve con el índice (banco_llegada, valor, fecha, hora).
+    """
+    if tolerance_seconds is None:
+        tolerance_seconds = settings.SIMILAR_DUPLICATE_TOLERANCE_SECONDS
+    if not candidates:
+        return []
+
+    query = Q(pk__in=[])
+    for fecha, hora, comprobante, banco_llegada_id, valor in candidates:
+        query |= Q(
+            banco_llegada_id=banco_llegada_id, valor=valor, fecha=fecha,
+            hora__range=_time_window(hora, tolerance_seconds),
+        )
+    existing = defaultdict(list)
+    for pk, fecha, hora, comprobante, banco_llegada_id, valor in FinancialRecord.objects.filter(query).values_list(
+        'pk', 'fecha', 'hora', 'comprobante', 'banco_llegada_id', 'valor'
+    ):
+        existing[(banco_llegada_id, valor, fecha)].append((pk, hora, comprobante))
+
+    results = []
+    for fecha, hora, comprobante, banco_llegada_id, valor in candidates:
+        low, high = _time_window(hora, tolerance_seconds)
+        exact = False
+        similar_ids = []
+        for pk, existing_hora, existing_comprobante in existing.get((banco_llegada_id, Decimal(str(valor)), fecha), ()):
+            if not low <= existing_hora <= high:
+                continue
+            if existing_hora == hora and existing_comprobante == comprobante:
+                exact = True
+            else:
+                similar_ids.append(pk)
+        results.append((exact, similar_ids))
+    return results
+
+
+# Campos de la restricción única de FinancialRecord (unique_together)
+RECEIPT_UNIQUE_FIELDS = ('fecha', 'hora', 'comprobante', 'banco_llegada', 'valor')
+
+
+def receipt_key(fecha, hora, comprobante, banco_llegada_id, valor):
+    """Clave de unicidad de un recibo, con el valor normalizado a 2 decimales."""
+    return (fecha, hora, comprobante, banco_llegada_id, Decimal(str(valor)).quantize(Decimal('0.01')))
+
+
+def insert_receipts_ignoring_duplicates(records, user=None, batch_size=1000):
+    """
+    Inserta recibos con INSERT ... ON CONFLICT DO NOTHING RETURNING sobre la restricción
+    única (fecha, hora, comprobante, banco_llegada, valor). Una sola ida a la BD por lote:
+    no hay consulta previa de existencia y las importaciones concurrentes no chocan.
+
+    Devuelve los recibos realmente insertados (con pk asignado) y crea su historial;
+    los que no aparecen en el resultado ya existían.
+    """
+    if not records:
+        return []
+
+    invalidate_list_counts(FinancialRecord)
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # Motores sin RETURNING: simple_history recupera los creados con una consulta adicional
+        return bulk_create_with_history(
+            records, FinancialRecord, batch_size=batch_size, ignore_conflicts=True, default_user=user
+        )
+
+    opts = FinancialRecord._meta
+    fields = [f for f in opts.concrete_fields if not f.primary_key]
+    unique_fields = [opts.get_field(name) for name in RECEIPT_UNIQUE_FIELDS]
+    qn = connection.ops.quote_name
+    sql_prefix = (
+        f"INSERT INTO {qn(opts.db_table)} ({', '.join(qn(f.column) for f in fields)}) VALUES "
+    )
+    sql_suffix = (
+        f" ON CONFLICT ({', '.join(qn(f.column) for f in unique_fields)}) DO NOTHING"
+        f" RETURNING {', '.join(qn(f.column) for f in [opts.pk] + unique_fields)}"
+    )
+    row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(1, min(batch_size, connection.ops.bulk_batch_size(fields, records)))
+
+    created = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            by_key = {}
+            params = []
+            for record in batch:
+                params.extend(f.get_db_prep_save(f.pre_save(record, True), connection) for f in fields)
+                by_key[receipt_key(record.fecha, record.hora, record.comprobante, record.banco_llegada_id, record.valor)] = record
+
+            cursor.execute(sql_prefix + ', '.join([row_placeholder] * len(batch)) + sql_suffix, params)
+            for pk, *values in cursor.fetchall():
+                # RETURNING no pasa por los conversores del ORM (en SQLite llegan como texto/float)
+                fecha, hora, comprobante, banco_id, valor = (f.to_python(v) for f, v in zip(unique_fields, values))
+                record = by_key[receipt_key(fecha, hora, comprobante, banco_id, valor)]
+                record.pk = pk
+                record._state.adding = False
+                created.append(record)
+
+    FinancialRecord.history.bulk_history_create(created, batch_size=batch_size, default_user=user)
+    return created
+
+
+def duplicate_fingerprint(fecha, hora, comprobante, banco_llegada_id, valor):
+    """
+    Huella de un intento de duplicado: sha1 de la clave del recibo normalizada (comprobante sin
+    espacios y en mayúsculas, valor a 2 decimales), para agrupar los reintentos del mismo recibo.
+    """
+    fecha, hora, comprobante, banco_llegada_id, valor = receipt_key(
+        fecha, hora, (comprobante or '').strip().upper(), banco_llegada_id, valor
+    )
+    raw = f"{fecha.isoformat()}|{hora.strftime('%H:%M:%S')}|{comprobante}|{banco_llegada_id}|{valor}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def build_duplicate_attempt(cleaned_data, user, attempt_type, **extra):
+    """DuplicateRecordAttempt (sin guardar) para los datos validados de un FinancialRecordForm."""
+    fecha, hora, banco_llegada, valor = (
+        cleaned_data['fecha'], cleaned_data['hora'], cleaned_data['banco_llegada'], cleaned_data['valor']
+    )
+    comprobante = (cleaned_data.get('comprobante') or '').strip()
+    return DuplicateRecordAttempt(
+        user=user,
+        data={k: str(v) for k, v in cleaned_data.items()},
+        attempt_type=attempt_type,
+        fingerprint=duplicate_fingerprint(fecha, hora, comprobante, banco_llegada.pk, valor),
+        banco_llegada=banco_llegada,
+        fecha=fecha,
+        hora=hora,
+        comprobante=comprobante,
+        valor=valor,
+        **extra
+    )
+
+
+def record_duplicate_attempts(attempts, batch_size=500):
+    """
+    Registra intentos de duplicado agrupando los abiertos por (huella, tipo): un único
+    INSERT ... ON CONFLICT DO UPDATE sobre la restricción unique_open_duplicate_attempt suma
+    `occurrences` y actualiza last_seen, usuario y datos de la fila sin resolver existente en vez
+    de crear otra. Los intentos ya resueltos o sin huella se insertan tal cual.
+    """
+    now = timezone.now()
+    plain, merged = [], {}
+    for attempt in attempts:
+        if attempt.is_resolved or not attempt.fingerprint:
+            plain.append(attempt)
+            continue
+        attempt.last_seen = now
+        key = (attempt.fingerprint, attempt.attempt_type)
+        if key in merged:
+            # Una misma sentencia no puede actualizar dos veces la misma fila: se agrupan antes
+            attempt.occurrences += merged[key].occurrences
+        merged[key] = attempt
+
+    if plain or merged:
+        invalidate_list_counts(DuplicateRecordAttempt)
+    if plain:
+        DuplicateRecordAttempt.objects.bulk_create(plain, batch_size=batch_size)
+    if not merged:
+        return
+
+    opts = DuplicateRecordAttempt._meta
+    fields = [f for f in opts.concrete_fields if not f.primary_key]
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    occurrences, last_seen, user, data = (
+        qn(opts.get_field(name).column) for name in ('occurrences', 'last_seen', 'user', 'data')
+    )
+    sql_prefix = f"INSERT INTO {table} ({', '.join(qn(f.column) for f in fields)}) VALUES "
+    sql_suffix = (
+        f" ON CONFLICT ({qn('fingerprint')}, {qn('attempt_type')}) WHERE NOT {qn('is_resolved')}"
+        f" DO UPDATE SET {occurrences} = {table}.{occurrences} + EXCLUDED.{occurrences},"
+        f" {last_seen} = EXCLUDED.{last_seen},"
+        f" {user} = COALESCE(EXCLUDED.{user}, {table}.{user}),"
+        f" {data} = EXCLUDED.{data}"
+    )
+    row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+    attempts = list(merged.values())
+    with connection.cursor() as cursor:
+        for start in range(0, len(attempts), batch_size):
+            batch = attempts[start:start + batch_size]
+            params = []
+            for attempt in batch:
+                # En las filas nuevas la primera y la última detección coinciden
+                attempt.timestamp = attempt.last_seen
+                params.extend(f.get_db_prep_save(getattr(attempt, f.attname), connection) for f in fields)
+            cursor.execute(sql_prefix + ', '.join([row_placeholder] * len(batch)) + sql_suffix, params)
+
+
+XLSX_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Detección de formato de archivos de texto (CSV de los bancos)
+TEXT_SAMPLE_SIZE = 64 * 1024
+CANDIDATE_ENCODINGS = ('utf-8', 'cp1252', 'latin-1')
+CANDIDATE_DELIMITERS = (';', ',', '\t', '|')  # En empate gana el primero: ';' es el formato de la plantilla
+TEXT_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+TextFormat = namedtuple('TextFormat', ['encoding', 'delimiter', 'confidence'])
+
+
+def _latin1_fallback(error):
+    """Manejador de errores de decodificación: los bytes inválidos se leen como Latin-1."""
+    return error.object[error.start:error.end].decode('latin-1'), error.end
+
+
+# Un byte Latin-1 suelto más allá de la muestra no debe abortar la importación a mitad de camino
+codecs.register_error('latin1_fallback', _latin1_fallback)
+
+
+def _encoding_score(sample, encoding):
+    """Proporción de caracteres plausibles al decodificar la muestra (0 si no decodifica)."""
+    try:
+        # Incremental y sin `final`: la muestra puede cortar un carácter multibyte al final
+        text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 0.0, ''
+    if not text:
+        return 1.0, text
+    plausible = sum(1 for ch in text if ch.isprintable() or ch in '\r\n\t')
+    return plausible / len(text), text
+
+
+def _delimiter_score(lines, delimiter):
+    """Fracción de líneas con el mismo número de columnas que la cabecera (0 si hay una sola columna)."""
+    widths = [len(row) for row in csv.reader(lines, delimiter=delimiter)]
+    if not widths or widths[0] < 2:
+        return 0.0
+    return Counter(widths)[widths[0]] / len(widths)
+
+
+def detect_text_format(sample):
+    """
+    Elige codificación y separador a partir de una única muestra de bytes del archivo.
+    Devuelve un TextFormat con la confianza (0-1) de la elección de separador.
+    """
+    encoding = None
+    for bom, bom_encoding in TEXT_BOMS:
+        if sample.startswith(bom):
+            encoding = bom_encoding
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            break
+    if encoding is None:
+        # UTF-8 válido con bytes no ASCII es casi imposible por azar: si decodifica, gana.
+        scored = [(_encoding_score(sample, candidate), candidate) for candidate in CANDIDATE_ENCODINGS]
+        (score, text), encoding = max(scored, key=lambda item: item[0][0])
+
+    # La última línea de la muestra puede estar cortada
+    lines = text.splitlines()
+    if len(sample) >= TEXT_SAMPLE_SIZE and len(lines) > 1:
+        lines = lines[:-1]
+    lines = [line for line in lines if line.strip()][:50]
+
+    delimiter, confidence = CANDIDATE_DELIMITERS[0], 0.0
+    for candidate in CANDIDATE_DELIMITERS:
+        score = _delimiter_score(lines, candidate)
+        if score > confidence:
+            delimiter, confidence = candidate, score
+    return TextFormat(encoding, delimiter, confidence)
+
+
+def iter_xlsx_rows(file_obj):
+    """
+    Recorre la hoja activa de un libro .xlsx en modo read-only de openpyxl: las filas se
+    leen del XML a medida que se piden, así que la memoria no crece con el tamaño del libro.
+    Devuelve listas como csv.reader, pero con las celdas tipadas (fechas, horas, números).
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            row = ['' if value is None else value.strip() if isinstance(value, str) else value for value in values]
+            # Filas vacías (formato sin datos al final de la hoja) se tratan como en el CSV
+            yield row if any(value != '' for value in row) else []
+    finally:
+        workbook.close()
+
+
+# Tabla temporal del motor COPY. Las tablas TEMPORARY de PostgreSQL no escriben WAL
+# (equivalen a UNLOGGED) y ON COMMIT DROP garantiza que no queden restos en conexiones persistentes.
+COPY_STAGING_TABLE = 'receipt_import_staging'
+
+
+def copy_staging_resolve_sql():
+    """Crea en bloque los bancos y orígenes que aparecen en la tabla temporal y aún no existen."""
+    qn = connection.ops.quote_name
+    bank_table = qn(Bank._meta.db_table)
+    origen_table = qn(OrigenTransaccion._meta.db_table)
+    return [
+        f"INSERT INTO {bank_table} (name) "
+        f"SELECT DISTINCT banco FROM {COPY_STAGING_TABLE} ON CONFLICT (name) DO NOTHING",
+        f"INSERT INTO {origen_table} (name, dias_efectivo) "
+        f"SELECT DISTINCT origen, 0 FROM {COPY_STAGING_TABLE} ON CONFLICT (name) DO NOTHING",
+    ]
+
+
+def copy_staging_insert_sql(user, now):
+    """
+    Sentencia única que, a partir de la tabla temporal:
+    1. Resuelve banco/origen por nombre y se queda con la primera línea de cada clave (duplicados del archivo).
+    2. Inserta los recibos con ON CONFLICT DO NOTHING (duplicados contra la BD).
+    3. Inserta el snapshot '+' de historial de los recibos realmente insertados.
+    4. Devuelve las líneas del archivo que NO se insertaron (duplicadas).
+    """
+    qn = connection.ops.quote_name
+    opts = FinancialRecord._meta
+    history_model = FinancialRecord.history.model
+    record_table = qn(opts.db_table)
+    history_table = qn(history_model._meta.db_table)
+    bank_table = qn(Bank._meta.db_table)
+    origen_table = qn(OrigenTransaccion._meta.db_table)
+    unique_columns = ', '.join(qn(opts.get_field(name).column) for name in RECEIPT_UNIQUE_FIELDS)
+    history_columns = ', '.join(qn(f.column) for f in history_model.tracked_fields)
+
+    sql = f"""
+        WITH candidates AS (
+            SELECT DISTINCT ON (s.fecha, s.hora, s.comprobante, b.id, s.valor)
+                   s.line, s.fecha, s.hora, s.comprobante, b.id AS banco_id, o.id AS origen_id, s.valor
+            FROM {COPY_STAGING_TABLE} s
+            JOIN {bank_table} b ON b.name = s.banco
+            JOIN {origen_table} o ON o.name = s.origen
+            ORDER BY s.fecha, s.hora, s.comprobante, b.id, s.valor, s.line
+        ),
+        inserted AS (
+            INSERT INTO {record_table}
+                (fecha, hora, comprobante, banco_llegada_id, origen_transaccion_id, valor,
+                 payment_status, creado, modificado, uploaded_by_id)
+            SELECT fecha, hora, comprobante, banco_id, origen_id, valor,
+                   'Aprobado', %(now)s, %(now)s, %(user_id)s
+            FROM candidates
+            ON CONFLICT ({unique_columns}) DO NOTHING
+            RETURNING *
+        ),
+        history AS (
+            INSERT INTO {history_table}
+                ({history_columns}, history_date, history_type, history_user_id, history_change_reason)
+            SELECT {history_columns}, %(now)s, '+', %(user_id)s, NULL
+            FROM inserted
+        )
+        SELECT s.line
+        FROM {COPY_STAGING_TABLE} s
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM candidates c
+            JOIN inserted i
+              ON i.fecha = c.fecha AND i.hora = c.hora AND i.comprobante = c.comprobante
+             AND i.banco_llegada_id = c.banco_id AND i.valor = c.valor
+            WHERE c.line = s.line
+        )
+        ORDER BY s.line
+    """
+    return sql, {'now': now, 'user_id': user.pk if user else None}
+
 
 class CSVProcessor:
     """
     Encapsula la lógica para procesar un archivo CSV de registros financieros.
     """
-    def __init__(self, csv_file):
+    # Tamaño de lote compartido por la inserción de recibos y de su historial
+    BATCH_SIZE = 1000
+    # Filas que se acumulan en memoria antes de cada COPY (motor 'copy')
+    COPY_CHUNK_SIZE = 50000
+
+    ENGINE_ORM = 'orm'    # bulk_create por lotes (cualquier motor de BD)
+    ENGINE_COPY = 'copy'  # COPY a tabla temporal + SQL por conjuntos (solo PostgreSQL)
+    ENGINES = (ENGINE_ORM, ENGINE_COPY)
+
+    def __init__(self, csv_file, user=None, engine=None, profile=None):
         self.csv_file = csv_file
-        self.column_mapping = {
-            'FECHA': 'fecha',
-            'HORA': 'hora',
-            '#COMPROBANTE': 'comprobante',
-            'BANCO LLEGADA': 'banco_llegada',
-            'VALOR': 'valor'
-        }
+        # Perfil de importación del banco (BankImportProfile); sin perfil se usa la plantilla estándar
+        self.profile = profile
+        # Usuario que sube el archivo: queda como uploaded_by y como history_user
+        self.user = user
+        # Por defecto el motor ORM. COPY se pide explícitamente (engine='copy') y solo aplica en
+        # PostgreSQL; en otros motores (SQLite en desarrollo) se usa siempre ORM.
+        if engine not in self.ENGINES:
+            engine = self.ENGINE_ORM
+        if connection.vendor != 'postgresql':
+            engine = self.ENGINE_ORM
+        self.engine = engine
+        self.is_xlsx = (getattr(csv_file, 'name', None) or '').lower().endswith(XLSX_EXTENSIONS)
+        self.layout = profile.layout() if profile else DEFAULT_LAYOUT
+        self.row_parser = None  # Se compila al leer la cabecera
         self.results = { # Corregido: self.results
             "processed": 0,
             "created": 0,
             "duplicates": 0,
-            "line_errors": []
+            "duplicate_lines": [],
+            "line_errors": [],
+            "skipped": 0,
+            "engine": self.engine,
+            "elapsed": 0.0,
+            "rows_per_second": 0.0,
         }
 
         # Origen por defecto si la columna no existe
         self.default_origen, _ = OrigenTransaccion.objects.get_or_create(name="IMPORTADO MASIVO")
+        # Bancos y orígenes ya resueltos en esta importación (evita un get_or_create por fila)
+        self._banks = {}
+        self._origenes = {self.default_origen.name: self.default_origen}
 
     def _get_reader(self):
-        """Prepara y devuelve un lector de CSV."""
-        # Lista de codificaciones a intentar
-        encodings_to_try = ['utf-8-sig', 'latin-1', 'utf-8']
-        
-        for encoding in encodings_to_try:
-            try:
-                # Volvemos al inicio del archivo en cada intento
-                self.csv_file.file.seek(0)
-                decoded_file = TextIOWrapper(self.csv_file.file, encoding=encoding)
-                
-                # Intentamos detectar el dialecto (separador)
-                try:
-                    dialect = csv.Sniffer().sniff(decoded_file.read(1024))
-                    decoded_file.seek(0)
-                    return csv.reader(decoded_file, dialect)
-                except csv.Error:
-                    decoded_file.seek(0)
-                    return csv.reader(decoded_file, delimiter=';') # Fallback a punto y coma
-            except (UnicodeDecodeError, AttributeError):
-                continue # Si falla la decodificación, prueba con la siguiente
-        
-        # Si ninguna codificación funcionó, lanzamos un error
-        raise ValueError("No se pudo decodificar el archivo. Asegúrate de que esté guardado en formato UTF-8 o Latin-1.")
+        """Prepara y devuelve un lector de CSV (o de filas de Excel si el archivo es .xlsx)."""
+        if self.is_xlsx:
+            self.csv_file.file.seek(0)
+            return iter_xlsx_rows(self.csv_file.file)
+
+        # Una sola muestra decide codificación y separador; después se decodifica en streaming
+        raw_file = self.csv_file.file
+        raw_file.seek(0)
+        text_format = detect_text_format(raw_file.read(TEXT_SAMPLE_SIZE))
+        raw_file.seek(0)
+        self.results['encoding'] = text_format.encoding
+        self.results['delimiter'] = text_format.delimiter
+        self.results['format_confidence'] = text_format.confidence
+
+        decoded_file = TextIOWrapper(raw_file, encoding=text_format.encoding, errors='latin1_fallback', newline='')
+        return csv.reader(decoded_file, delimiter=text_format.delimiter)
 
     def _validate_header(self, header):
         """Valida que el header del CSV contenga las columnas requeridas (excepto origen_transaccion)."""
-        missing_columns = [col for col in self.column_mapping.keys() if col not in header]
+        missing_columns = [col for col in required_columns(self.layout) if col.upper() not in header]
         if missing_columns:
             raise ValueError(f'Faltan las siguientes columnas en el CSV: {", ".join(missing_columns)}')
 
-    def _parse_row(self, row, header_map):
-        """Parsea una fila del CSV y la convierte en un diccionario de datos."""
-        row_data = {}
-        for col_name, field_name in self.column_mapping.items():
-            value = row[header_map[col_name]].strip()
-            if field_name == 'fecha':
-                row_data[field_name] = datetime.strptime(value, '%d/%m/%Y').date()
-            elif field_name == 'hora':
-                row_data[field_name] = datetime.strptime(value, '%H:%M:%S').time()
-            elif field_name == 'valor':
-                row_data[field_name] = float(value.replace(',', '.'))
-            elif field_name == 'banco_llegada':
-                bank, _ = Bank.objects.get_or_create(name=value.upper())
-                row_data[field_name] = bank
-            else:
-                row_data[field_name] = value
+    def _read_header(self, reader):
+        """
+        Lee la cabecera (omitiendo el preámbulo del perfil, si lo hay), la valida y compila el
+        parser de filas. Devuelve el número de línea de la primera fila de datos.
+        """
+        skip_rows = self.profile.skip_rows if self.profile else 0
+        for _ in range(skip_rows):
+            next(reader, None)
+        header = next(reader, None)
+        if not header:
+            raise ValueError("El archivo CSV está vacío.")
 
-        # Asignar el origen de transacción
-        if 'ORIGEN TRANSACCION' in header_map:
-            origen_valor = row[header_map['ORIGEN TRANSACCION']].strip()
-            origen, _ = OrigenTransaccion.objects.get_or_create(name=origen_valor.upper())
-            row_data['origen_transaccion'] = origen
-        else:
-            # Si la columna no existe, usar el valor por defecto
-            row_data['origen_transaccion'] = self.default_origen
+        header = [cell_to_str(col).upper() for col in header]
+        self._validate_header(header)
+        header_map = {col: i for i, col in enumerate(header)}
+        self.row_parser = compile_row_parser(
+            header_map,
+            default_origen=self.default_origen.name,
+            bank_name=self.profile.bank.name if self.profile else None,
+            **self.layout,
+        )
+        return skip_rows + 2
+
+    def _parse_values(self, row):
+        """
+        Parsea una fila del CSV a valores planos, sin consultar la base de datos.
+        Banco y origen quedan como nombres en mayúsculas; cada motor los resuelve a su manera.
+        Devuelve None si la fila debe omitirse según la convención de signo del perfil.
+        """
+        data = self.row_parser(row)
+        if data is None:
+            self.results['skipped'] += 1
+        return data
+
+    def _get_bank(self, name):
+        if name not in self._banks:
+            self._banks[name], _ = Bank.objects.get_or_create(name=name)
+        return self._banks[name]
 
+    def _get_origen(self, name):
+        if name not in self._origenes:
+            self._origenes[name], _ = OrigenTransaccion.objects.get_or_create(name=name)
+        return self._origenes[name]
+
+    def _parse_row(self, row):
+        """Parsea una fila del CSV y la convierte en un diccionario de datos."""
+        row_data = self._parse_values(row)
+        if row_data is None:
+            return None
+        row_data['banco_llegada'] = self._get_bank(row_data['banco_llegada'])
+        row_data['origen_transaccion'] = self._get_origen(row_data['origen_transaccion'])
 
         # --- INICIO: Asignar estado de pago Aprobado ---
         row_data['payment_status'] = 'Aprobado'
@@ -93,96 +635,249 @@ class CSVProcessor:
 
     def process(self):
         """Orquesta el proceso completo de lectura, validación e inserción."""
+        started = time.perf_counter()
         reader = self._get_reader()
-        header = next(reader, None)
-        if not header:
-            raise ValueError("El archivo CSV está vacío.")
+        first_line = self._read_header(reader)
 
-        self._validate_header(header)
-        header_map = {col: i for i, col in enumerate(header)}
+        if self.engine == self.ENGINE_COPY:
+            self._process_copy(reader, first_line)
+        else:
+            self._process_orm(reader, first_line)
+
+        # Throughput para poder comparar motores
+        elapsed = time.perf_counter() - started
+        self.results['elapsed'] = elapsed
+        self.results['rows_per_second'] = self.results['processed'] / elapsed if elapsed else 0.0
+        return self
+
+    def _process_orm(self, reader, first_line):
+        """
+        Motor ORM: parseo fila a fila e inserción con ON CONFLICT DO NOTHING en lotes de
+        BATCH_SIZE a medida que se leen las filas, así la memoria no crece con el archivo.
+        Los repetidos dentro de un lote se descartan en memoria; los repetidos entre lotes y
+        los que ya existían los descarta la restricción única.
+        """
+        with transaction.atomic():
+            pending = {}
+            for i, row in enumerate(reader, start=first_line):
+                self.results['processed'] += 1
+                if not row:
+                    continue
+                try:
+                    row_data = self._parse_row(row)
+                except (ValueError, IndexError, KeyError) as e:
+                    self.results['line_errors'].append(f"Línea {i}: {e}")
+                    continue
+                if row_data is None:
+                    continue
+
+                key = receipt_key(
+                    row_data['fecha'], row_data['hora'], row_data['comprobante'],
+                    row_data['banco_llegada'].id, row_data['valor'],
+                )
+                if key in pending:
+                    self.results['duplicate_lines'].append(i)
+                    continue
+                pending[key] = (i, FinancialRecord(uploaded_by=self.user, **row_data))
+                if len(pending) >= self.BATCH_SIZE:
+                    self._insert_pending(pending)
+                    pending = {}
+            self._insert_pending(pending)
+
+        self.results['duplicate_lines'].sort()
+        self.results['duplicates'] = len(self.results['duplicate_lines'])
+
+    def _insert_pending(self, pending):
+        """Inserta un lote {clave: (línea, recibo)}; las líneas no insertadas cuentan como duplicadas."""
+        if not pending:
+            return
+        try:
+            created_objects = insert_receipts_ignoring_duplicates(
+                [record for _, record in pending.values()], user=self.user, batch_size=self.BATCH_SIZE
+            )
+        except Exception as e:
+            raise Exception(f"Error durante la creación masiva de registros: {e}")
+
+        created_keys = {
+            receipt_key(r.fecha, r.hora, r.comprobante, r.banco_llegada_id, r.valor) for r in created_objects
+        }
+        self.results['created'] += len(created_objects)
+        self.results['duplicate_lines'].extend(
+            line for key, (line, _) in pending.items() if key not in created_keys
+        )
+
+    def _process_copy(self, reader, first_line):
+        """
+        Motor COPY (PostgreSQL): las filas normalizadas se cargan con COPY en una tabla
+        temporal (sin WAL, se elimina al confirmar) y desde ahí, con SQL por conjuntos:
+        se crean los bancos/orígenes nuevos, se descartan duplicados (del archivo y de la BD)
+        y se insertan recibos e historial en una sola sentencia.
+        """
+        staged = 0
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"""
+                    CREATE TEMPORARY TABLE {COPY_STAGING_TABLE} (
+                        line integer NOT NULL,
+                        fecha date NOT NULL,
+                        hora time NOT NULL,
+                        comprobante varchar(200) NOT NULL,
+                        banco varchar(100) NOT NULL,
+                        origen varchar(100) NOT NULL,
+                        valor numeric(12, 2) NOT NULL
+                    ) ON COMMIT DROP
+                """)
+
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, quoting=csv.QUOTE_ALL) # QUOTE_ALL: '' es texto vacío, no NULL
+                pending = 0
+                for i, row in enumerate(reader, start=first_line):
+                    self.results['processed'] += 1
+                    if not row:
+                        continue
+                    try:
+                        data = self._parse_values(row)
+                    except (ValueError, IndexError, KeyError) as e:
+                        self.results['line_errors'].append(f"Línea {i}: {e}")
+                        continue
+                    if data is None:
+                        continue
+                    writer.writerow([
+                        i, data['fecha'].isoformat(), data['hora'].isoformat(), data['comprobante'],
+                        data['banco_llegada'], data['origen_transaccion'], data['valor'],
+                    ])
+                    pending += 1
+                    if pending >= self.COPY_CHUNK_SIZE:
+                        self._copy_to_staging(cursor, buffer)
+                        staged += pending
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+                        pending = 0
+                if pending:
+                    self._copy_to_staging(cursor, buffer)
+                    staged += pending
+
+                if not staged:
+                    return
+
+                for sql in copy_staging_resolve_sql():
+                    cursor.execute(sql)
+                invalidate_filter_choices(Bank._meta.label_lower, OrigenTransaccion._meta.label_lower)
+                cursor.execute(*copy_staging_insert_sql(self.user, timezone.now()))
+                duplicate_lines = [row[0] for row in cursor.fetchall()]
+                invalidate_list_counts(FinancialRecord)
+        except Exception as e:
+            raise Exception(f"Error durante la creación masiva de registros: {e}")
+
+        self.results['duplicate_lines'] = duplicate_lines
+        self.results['duplicates'] = len(duplicate_lines)
+        self.results['created'] = staged - len(duplicate_lines)
 
-        records_to_process = []
-        for i, row in enumerate(reader, start=2):  # Empezar en 2 para contar la cabecera
+    def _copy_to_staging(self, cursor, buffer):
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {COPY_STAGING_TABLE} (line, fecha, hora, comprobante, banco, origen, valor) "
+            f"FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    def parse_lines(self):
+        """
+        Lee y parsea el archivo sin escribir nada (p.ej. extractos para conciliar).
+        Devuelve una lista de (línea, valores); los errores quedan en results['line_errors'].
+        """
+        reader = self._get_reader()
+        first_line = self._read_header(reader)
+        parsed = []
+        for i, row in enumerate(reader, start=first_line):
             self.results['processed'] += 1
             if not row:
                 continue
             try:
-                row_data = self._parse_row(row, header_map)
-                records_to_process.append(row_data)
+                data = self._parse_values(row)
             except (ValueError, IndexError, KeyError) as e:
                 self.results['line_errors'].append(f"Línea {i}: {e}")
+                continue
+            if data is not None:
+                parsed.append((i, data))
+        return parsed
 
-        if records_to_process:
-            print(f"DEBUG: Intentando procesar {len(records_to_process)} registros.")
-            
-            # --- INICIO DE LA SOLUCIÓN ---
-            # 1. Eliminar duplicados DENTRO del propio archivo CSV antes de comparar con la BD.
-            unique_records_in_csv = {}
-            for data in records_to_process:
-                # Creamos una clave única para cada registro
-                key = (
-                    data['fecha'],
-                    data['hora'],
-                    data['comprobante'],
-                    data['banco_llegada'].id,
-                    Decimal(str(data['valor'])).quantize(Decimal('0.01'))
-                )
-                # Si la clave no está en el diccionario, la añadimos. Esto descarta duplicados.
-                if key not in unique_records_in_csv:
-                    unique_records_in_csv[key] = data
-            
-            # Ahora `records_to_process` solo contiene registros únicos del CSV.
-            records_to_process = list(unique_records_in_csv.values())
-            # --- FIN DE LA SOLUCIÓN ---
+    def stage(self, file_name=''):
+        """
+        Modo previsualización: parsea, valida y clasifica cada fila (nueva, duplicada o con error)
+        en un ImportBatch. No escribe en FinancialRecord ni crea bancos/orígenes; eso lo hace
+        commit_import_batch con las filas ya validadas, sin volver a leer el archivo.
+        Las filas se escriben en StagedReceipt por lotes de BATCH_SIZE a medida que se leen.
+        """
+        reader = self._get_reader()
+        first_line = self._read_header(reader)
 
-            try:
-                with transaction.atomic():
-                    # Consultar la base de datos para encontrar qué registros ya existen
-                    existing_records = FinancialRecord.objects.filter(
-                        fecha__in=[data['fecha'] for data in records_to_process],
-                        comprobante__in=[data['comprobante'] for data in records_to_process]
-                    ).values_list('fecha', 'hora', 'comprobante', 'banco_llegada_id', 'valor')
-
-                    existing_record_keys = set()
-                    for record in existing_records:
-                        # Convertimos el valor de la BD a Decimal para una comparación precisa
-                        key = (
-                            record[0], # fecha (date)
-                            record[1], # hora (time)
-                            record[2], # comprobante (str)
-                            record[3], # banco_llegada_id (int)
-                            Decimal(record[4]).quantize(Decimal('0.01')) # valor (Decimal)
-                        )
-                        existing_record_keys.add(key)
-
-                    # Filtrar los registros que no existen en la base de datos
-                    records_to_create = []
-                    for data in records_to_process:
-                        key = (
-                            data['fecha'],
-                            data['hora'],
-                            data['comprobante'],
-                            data['banco_llegada'].id,
-                            Decimal(str(data['valor'])).quantize(Decimal('0.01'))
-                        )
-                        if key not in existing_record_keys:
-                            records_to_create.append(FinancialRecord(**data))
-
-                    # Creación masiva de los nuevos registros
-                    if records_to_create:
-                        created_objects = FinancialRecord.objects.bulk_create(records_to_create)
-                        self.results['created'] = len(created_objects)
-                    else:
-                        self.results['created'] = 0
-                    
-                    self.results['duplicates'] = len(records_to_process) - self.results['created']
-
-                    print(f"DEBUG: Creados {self.results['created']} | Duplicados {self.results['duplicates']}")
-
-            except Exception as e:
-                raise Exception(f"Error durante la creación masiva de registros: {e}")
-        
-        return self
+        with transaction.atomic():
+            batch = ImportBatch.objects.create(uploaded_by=self.user, file_name=file_name[:255])
+            pending = []
+            for i, row in enumerate(reader, start=first_line):
+                self.results['processed'] += 1
+                if not row:
+                    continue
+                raw = ';'.join(cell_to_str(value) for value in row)
+                try:
+                    data = self._parse_values(row)
+                except (ValueError, IndexError, KeyError) as e:
+                    self.results['line_errors'].append(f"Línea {i}: {e}")
+                    pending.append(StagedReceipt(batch=batch, line=i, status='ERROR', raw=raw, error=str(e)))
+                    continue
+                if data is None:
+                    continue
+
+                pending.append(StagedReceipt(
+                    batch=batch, line=i, status='NEW', raw=raw,
+                    fecha=data['fecha'], hora=data['hora'], comprobante=data['comprobante'],
+                    banco=data['banco_llegada'], origen=data['origen_transaccion'],
+                    valor=Decimal(str(data['valor'])).quantize(Decimal('0.01')),
+                ))
+                if len(pending) >= self.BATCH_SIZE:
+                    self._stage_rows(pending)
+                    pending = []
+            self._stage_rows(pending)
+
+            # Duplicados dentro del propio archivo, con una sola sentencia sobre todo el staging:
+            # cada fila nueva con otra anterior de la misma clave (el banco aún va por nombre)
+            earlier_rows = StagedReceipt.objects.filter(
+                batch=batch, status='NEW', line__lt=OuterRef('line'),
+                fecha=OuterRef('fecha'), hora=OuterRef('hora'), comprobante=OuterRef('comprobante'),
+                banco=OuterRef('banco'), valor=OuterRef('valor'),
+            )
+            batch.rows.filter(Exists(earlier_rows), status='NEW').update(status='DUPLICATE')
+
+            counts = dict(batch.rows.order_by().values_list('status').annotate(total=Count('pk')))
+            batch.processed = self.results['processed']
+            batch.new_count = counts.get('NEW', 0)
+            batch.duplicate_count = counts.get('DUPLICATE', 0)
+            batch.error_count = len(self.results['line_errors'])
+            batch.save(update_fields=['processed', 'new_count', 'duplicate_count', 'error_count'])
+        return batch
+
+    def _stage_rows(self, staged_rows):
+        """Marca las filas que ya existen en la BD como duplicadas y escribe el lote en StagedReceipt."""
+        new_rows = [r for r in staged_rows if r.status == 'NEW']
+        existing_keys = self._existing_receipt_keys(new_rows)
+        for staged in new_rows:
+            if receipt_key(staged.fecha, staged.hora, staged.comprobante, staged.banco, staged.valor) in existing_keys:
+                staged.status = 'DUPLICATE'
+        StagedReceipt.objects.bulk_create(staged_rows, batch_size=self.BATCH_SIZE)
+
+    def _existing_receipt_keys(self, staged_rows):
+        """Claves (con el banco por nombre) de los recibos de `staged_rows` que ya existen en la BD."""
+        existing = set()
+        bank_names = {r.banco for r in staged_rows}
+        comprobantes = sorted({r.comprobante for r in staged_rows})
+        for start in range(0, len(comprobantes), self.BATCH_SIZE):
+            rows = FinancialRecord.objects.filter(
+                comprobante__in=comprobantes[start:start + self.BATCH_SIZE],
+                banco_llegada__name__in=bank_names,
+            ).values_list('fecha', 'hora', 'comprobante', 'banco_llegada__name', 'valor')
+            existing.update(receipt_key(*row) for row in rows)
+        return existing
 
     def get_messages(self):
         """Genera una lista de mensajes para mostrar al usuario."""
@@ -192,9 +887,21 @@ class CSVProcessor:
             return messages
 
         messages.append(('info', f"Registros procesados: {self.results['processed']}"))
+        messages.append(('info', f"Motor de importación: {self.results['engine']} ({self.results['rows_per_second']:,.0f} filas/s)"))
+        if 'encoding' in self.results:
+            delimiter = 'tabulador' if self.results['delimiter'] == '\t' else f"'{self.results['delimiter']}'"
+            level = 'info' if self.results['format_confidence'] >= 0.9 else 'warning'
+            messages.append((level, f"Formato detectado: codificación {self.results['encoding']}, separador {delimiter}"))
         messages.append(('info', f"Registros creados exitosamente: {self.results['created']}"))
+        if self.results['skipped']:
+            messages.append(('info', f"Filas omitidas por la convención de signo del perfil: {self.results['skipped']}"))
         if self.results['duplicates'] > 0:
             messages.append(('info', f"Registros rechazados por duplicidad: {self.results['duplicates']}"))
+            duplicate_lines = self.results['duplicate_lines']
+            shown = ', '.join(str(line) for line in duplicate_lines[:20])
+            if len(duplicate_lines) > 20:
+                shown += f' ... y {len(duplicate_lines) - 20} más'
+            messages.append(('info', f"Líneas duplicadas: {shown}"))
         
         num_line_errors = len(self.results['line_errors'])
         if num_line_errors > 0:
@@ -205,3 +912,135 @@ class CSVProcessor:
                 messages.append(('warning', f'... y {num_line_errors - 10} errores más.'))
         
         return messages
+
+
+def commit_import_batch(batch, user):
+    """
+    Confirma una importación en previsualización: inserta en bloque las filas marcadas como
+    nuevas (con ON CONFLICT DO NOTHING por si otro proceso insertó las mismas mientras tanto),
+    crea los bancos/orígenes que falten y elimina el área de staging.
+    """
+    with transaction.atomic():
+        batch = ImportBatch.objects.select_for_update().get(pk=batch.pk)
+        if batch.status != 'PREVIEW':
+            raise ValueError("Esta importación ya fue confirmada o descartada.")
+
+        staged_rows = list(batch.rows.filter(status='NEW').order_by('line'))
+        banks = {}
+        origenes = {}
+        for name in {r.banco for r in staged_rows}:
+            banks[name], _ = Bank.objects.get_or_create(name=name)
+        for name in {r.origen for r in staged_rows}:
+            origenes[name], _ = OrigenTransaccion.objects.get_or_create(name=name)
+
+        records = [
+            FinancialRecord(
+                fecha=r.fecha, hora=r.hora, comprobante=r.comprobante,
+                banco_llegada=banks[r.banco], origen_transaccion=origenes[r.origen],
+                valor=r.valor, payment_status='Aprobado', uploaded_by=user,
+            )
+            for r in staged_rows
+        ]
+        created = insert_receipts_ignoring_duplicates(records, user=user, batch_size=CSVProcessor.BATCH_SIZE)
+
+        batch.created_count = len(created)
+        batch.status = 'COMMITTED'
+        batch.committed_at = timezone.now()
+        batch.save(update_fields=['created_count', 'status', 'committed_at'])
+        batch.rows.all().delete()
+    return batch
+
+
+def discard_import_batch(batch):
+    """Descarta una importación en previsualización y libera su área de staging."""
+    with transaction.atomic():
+        batch = ImportBatch.objects.select_for_update().get(pk=batch.pk)
+        if batch.status != 'PREVIEW':
+            raise ValueError("Esta importación ya fue confirmada o descartada.")
+        batch.status = 'DISCARDED'
+        batch.save(update_fields=['status'])
+        batch.rows.all().delete()
+    return batch
+
+
+class ClientBulkLoader:
+    """
+    Carga masiva de clientes basada en conjuntos.
+
+    Recibe un DataFrame con las columnas 'name' y 'dni' y:
+    1. Normaliza nombre y DNI con operaciones vectorizadas de pandas (misma regla que Client.save).
+    2. Descarta filas vacías y duplicados dentro del propio archivo.
+    3. Consulta los DNI existentes por lotes (una consulta por lote, no por fila).
+    4. Inserta los nuevos con bulk_create por lotes; los que choquen con una carga concurrente
+       se omiten y se informan como 'skipped'.
+
+    La usan tanto la vista bulk_client_upload como el comando load_clients.
+    """
+    REQUIRED_COLUMNS = ['name', 'dni']
+    BATCH_SIZE = 2000
+
+    def __init__(self, df):
+        self.df = df
+        self.results = {
+            "processed": 0,
+            "created": 0,
+            "duplicates": 0,
+            "skipped": 0,  # DNI nuevos que otra carga insertó mientras tanto
+            "errors": 0,
+        }
+
+    def _validate_columns(self):
+        if not all(col in self.df.columns for col in self.REQUIRED_COLUMNS):
+            raise ValueError("El archivo debe contener las columnas 'name' y 'dni'.")
+
+    def _normalize(self, df):
+        """Aplica la limpieza de Client.save a columnas completas en lugar de fila por fila."""
+        df = df.dropna(subset=self.REQUIRED_COLUMNS)
+        df = df.assign(
+            name=normalize_client_name_series(df['name']),
+            dni=normalize_dni_series(df['dni']),
+        )
+        return df
+
+    def _existing_dnis(self, dnis):
+        existing = set()
+        for start in range(0, len(dnis), self.BATCH_SIZE):
+            batch = dnis[start:start + self.BATCH_SIZE]
+            existing.update(Client.objects.filter(dni__in=batch).values_list('dni', flat=True))
+        return existing
+
+    def _count_dnis(self, dnis):
+        return sum(
+            Client.objects.filter(dni__in=dnis[start:start + self.BATCH_SIZE]).count()
+            for start in range(0, len(dnis), self.BATCH_SIZE)
+        )
+
+    def process(self):
+        self._validate_columns()
+        self.results['processed'] = len(self.df)
+
+        df = self._normalize(self.df[self.REQUIRED_COLUMNS])
+        # Filas sin nombre o DNI (nulas o que quedaron vacías tras la limpieza)
+        df = df[(df['name'] != '') & (df['dni'] != '')]
+        self.results['errors'] = self.results['processed'] - len(df)
+
+        # Duplicados dentro del propio archivo: se conserva la primera aparición
+        df = df.drop_duplicates(subset='dni', keep='first')
+
+        existing = self._existing_dnis(df['dni'].tolist())
+        new_rows = df[~df['dni'].isin(existing)]
+
+        new_dnis = new_rows['dni'].tolist()
+        clients = [Client(name=name, dni=dni) for name, dni in zip(new_rows['name'], new_dnis)]
+        with transaction.atomic():
+            # ignore_conflicts protege frente a cargas concurrentes con el mismo DNI; esas filas no
+            # se insertan, así que los creados se cuentan en la BD y no con len(clients)
+            before = self._count_dnis(new_dnis)
+            Client.objects.bulk_create(clients, batch_size=self.BATCH_SIZE, ignore_conflicts=True)
+            self.results['created'] = self._count_dnis(new_dnis) - before
+            invalidate_list_counts(Client)
+
+        self.results['skipped'] = len(clients) - self.results['created']
+        # Repetidos en el archivo o ya existentes antes de la carga
+        self.results['duplicates'] = self.results['processed'] - self.results['errors'] - len(clients)
+        return self
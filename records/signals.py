@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .choices import FACTURADOR_CHOICES, REFERENCE_MODELS, facturador_choices_stale, invalidate_filter_choices
+from .models import Client, DuplicateRecordAttempt, FinancialRecord, Transaction
+from .pagination import invalidate_list_counts
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+@receiver([post_save, post_delete], sender=FinancialRecord)
+@receiver([post_save, post_delete], sender=Client)
+@receiver([post_save, post_delete], sender=DuplicateRecordAttempt)
+def invalidate_cached_list_counts(sender, **kwargs):
+    # Los totales de los listados paginados (ver pagination.cached_count) dependen de estas tablas
+    invalidate_list_counts(sender)
+
+
+def invalidate_cached_filter_choices(sender, update_fields=None, **kwargs):
+    # El login solo guarda last_login, que no cambia la lista de usuarios
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # Desplegables de los filtros (ver choices.model_choices)
+    invalidate_filter_choices(sender._meta.label_lower)
+
+
+for model in REFERENCE_MODELS:
+    post_save.connect(invalidate_cached_filter_choices, sender=model)
+    post_delete.connect(invalidate_cached_filter_choices, sender=model)
+
+
+@receiver(post_save, sender=Transaction)
+def invalidate_facturador_choices(sender, instance, **kwargs):
+    # Solo un facturador nuevo cambia la lista; uno que deja de usarse queda hasta el TTL
+    if instance.facturador and facturador_choices_stale(instance.facturador):
+        invalidate_filter_choices(FACTURADOR_CHOICES)
+
+
+@receiver(pre_delete, sender=Transaction)
+def remember_orphaned_receipts(sender, instance, **kwargs):
+    # on_delete=SET_NULL desvincula los recibos con un UPDATE masivo, sin pasar por save()
+    instance._orphaned_receipt_ids = list(instance.receipts.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_orphaned_receipts_client(sender, instance, **kwargs):
+    # Los recibos sin cliente directo heredaban el de la transacción borrada
+    receipt_ids = getattr(instance, '_orphaned_receipt_ids', None)
+    if receipt_ids:
+        FinancialRecord.refresh_effective_client(pk__in=receipt_ids)
+
+
+@receiver(post_delete, sender=FinancialRecord)
+def refresh_counters_after_receipt_delete(sender, instance, **kwargs):
+    # Cubre delete() y el borrado por queryset (p. ej. delete_selected del admin)
+    Transaction.schedule_receipt_counter_refresh(
+        {instance.transaction_id, getattr(instance, '_loaded_transaction_id', None)}
+    )
@@ -1,3 +1,564 @@
-from django.test import TestCase
+import datetime as dt
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .choices import model_choices
+from .filters import CreditFilter, TransactionFilter
+from .models import (
+    Bank, Client, DuplicateRecordAttempt, FinancialRecord, ImportBatch, OrigenTransaccion,
+    PendingReceiptCounterRefresh, Seller, Transaction, TransactionType,
+)
+from .pagination import cached_count, invalidate_list_counts
+from .services import ClientBulkLoader, CSVProcessor
+
+
+class RecordsTestData:
+    """Datos mínimos compartidos por los tests: banco, origen, vendedor, tipo y usuario."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='p')
+        cls.bank = Bank.objects.create(name='BANCO TEST')
+        cls.origen = OrigenTransaccion.objects.create(name='TRANSFERENCIA')
+        cls.seller = Seller.objects.create(name='VENDEDOR')
+        # La migración 0025 ya crea el tipo por defecto (id=1)
+        cls.transaction_type = TransactionType.objects.get(pk=1)
+
+    def make_transaction(self, **kwargs):
+        kwargs.setdefault('vendedor', self.seller)
+        kwargs.setdefault('transaction_type', self.transaction_type)
+        kwargs.setdefault('expected_amount', Decimal('1000.00'))
+        kwargs.setdefault('created_by', self.user)
+        return Transaction.objects.create(**kwargs)
+
+    def make_receipt(self, comprobante, **kwargs):
+        kwargs.setdefault('fecha', dt.date(2025, 1, 15))
+        kwargs.setdefault('hora', dt.time(10, 0))
+        kwargs.setdefault('banco_llegada', self.bank)
+        kwargs.setdefault('origen_transaccion', self.origen)
+        kwargs.setdefault('valor', Decimal('500.00'))
+        return FinancialRecord.objects.create(comprobante=comprobante, **kwargs)
+
+
+class EffectiveClientTests(RecordsTestData, TestCase):
+
+    def test_deleting_transaction_clears_inherited_client(self):
+        client = Client.objects.create(name='ANA', dni='111')
+        transaction = self.make_transaction(cliente=client)
+        receipt = self.make_receipt('C-1', transaction=transaction)
+        self.assertEqual(receipt.effective_client, client)
+
+        transaction.delete()
+
+        receipt.refresh_from_db()
+        self.assertIsNone(receipt.transaction_id)
+        self.assertIsNone(receipt.effective_client_id)
+        self.assertEqual(receipt.display_client(), 'N/A')
+        matches = CreditFilter({'display_client': 'ANA'}, queryset=FinancialRecord.objects.all()).qs
+        self.assertNotIn(receipt, matches)
+
+    def test_deleting_transactions_in_bulk_keeps_direct_client(self):
+        client = Client.objects.create(name='ANA', dni='111')
+        other = Client.objects.create(name='LUIS', dni='222')
+        transaction = self.make_transaction(cliente=client)
+        inherited = self.make_receipt('C-1', transaction=transaction)
+        direct = self.make_receipt('C-2', transaction=transaction, cliente=other)
+
+        # Borrado por queryset, como la acción delete_selected del admin
+        Transaction.objects.filter(pk=transaction.pk).delete()
+
+        inherited.refresh_from_db()
+        direct.refresh_from_db()
+        self.assertIsNone(inherited.effective_client_id)
+        self.assertEqual(direct.effective_client, other)
+
+
+class ReceiptImportEngineTests:
+    """
+    Misma importación para los dos motores de CSVProcessor: una fila ya existente en la BD, una
+    fila repetida dentro del archivo y un banco nuevo.
+    """
+    engine = None
+    CSV = (
+        "FECHA;HORA;#COMPROBANTE;VALOR;BANCO LLEGADA;ORIGEN TRANSACCION\n"
+        "15/01/2025;10:00:00;EXISTENTE;500;BANCO TEST;TRANSFERENCIA\n"
+        "15/01/2025;11:00:00;NUEVO-1;750.50;BANCO TEST;TRANSFERENCIA\n"
+        "15/01/2025;11:00:00;NUEVO-1;750.50;BANCO TEST;TRANSFERENCIA\n"
+        "16/01/2025;09:30:00;NUEVO-2;1200;BANCO NUEVO;CONSIGNACION\n"
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user('importer', password='p')
+        self.bank = Bank.objects.create(name='BANCO TEST')
+        self.origen = OrigenTransaccion.objects.create(name='TRANSFERENCIA')
+        FinancialRecord.objects.create(
+            fecha=dt.date(2025, 1, 15), hora=dt.time(10, 0), comprobante='EXISTENTE',
+            banco_llegada=self.bank, origen_transaccion=self.origen, valor=Decimal('500.00'),
+        )
+
+    def run_import(self):
+        upload = SimpleUploadedFile('extracto.csv', self.CSV.encode('utf-8'))
+        return CSVProcessor(upload, user=self.user, engine=self.engine).process().results
+
+    def test_import_skips_duplicates_and_writes_history(self):
+        results = self.run_import()
+
+        self.assertEqual(results['engine'], self.engine)
+        self.assertEqual(results['processed'], 4)
+        self.assertEqual(results['created'], 2)
+        self.assertEqual(results['duplicates'], 2)
+        self.assertEqual(sorted(results['duplicate_lines']), [2, 4])
+
+        imported = FinancialRecord.objects.filter(comprobante__startswith='NUEVO')
+        self.assertEqual(imported.count(), 2)
+        self.assertTrue(all(r.uploaded_by_id == self.user.pk and r.payment_status == 'Aprobado' for r in imported))
+        self.assertEqual(imported.get(comprobante='NUEVO-2').banco_llegada.name, 'BANCO NUEVO')
+        self.assertTrue(OrigenTransaccion.objects.filter(name='CONSIGNACION').exists())
+
+        history = FinancialRecord.history.filter(comprobante__startswith='NUEVO')
+        self.assertEqual(history.count(), 2)
+        self.assertTrue(all(h.history_type == '+' and h.history_user_id == self.user.pk for h in history))
+
+
+class OrmImportEngineTests(ReceiptImportEngineTests, TestCase):
+    engine = CSVProcessor.ENGINE_ORM
+
+    def test_inserts_in_batches_as_rows_are_read(self):
+        # Con lotes de una fila el repetido del archivo lo descarta la restricción única
+        with mock.patch.object(CSVProcessor, 'BATCH_SIZE', 1):
+            self.test_import_skips_duplicates_and_writes_history()
+
+    def test_orm_is_the_default_engine(self):
+        upload = SimpleUploadedFile('extracto.csv', self.CSV.encode('utf-8'))
+        self.assertEqual(CSVProcessor(upload).engine, CSVProcessor.ENGINE_ORM)
+
+
+class ImportPreviewStageTests(RecordsTestData, TestCase):
+    CSV = ReceiptImportEngineTests.CSV + (
+        "sin fecha;10:00:00;MALA;1;BANCO TEST;TRANSFERENCIA\n"
+        "15/01/2025;11:00:00;NUEVO-1;750.50;BANCO TEST;TRANSFERENCIA\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        FinancialRecord.objects.create(
+            fecha=dt.date(2025, 1, 15), hora=dt.time(10, 0), comprobante='EXISTENTE',
+            banco_llegada=cls.bank, origen_transaccion=cls.origen, valor=Decimal('500.00'),
+        )
+
+    def test_stage_classifies_rows_in_batches(self):
+        upload = SimpleUploadedFile('extracto.csv', self.CSV.encode('utf-8'))
+        with mock.patch.object(CSVProcessor, 'BATCH_SIZE', 2):
+            batch = CSVProcessor(upload, user=self.user).stage('extracto.csv')
+
+        statuses = dict(batch.rows.values_list('line', 'status'))
+        self.assertEqual(statuses, {
+            2: 'DUPLICATE', 3: 'NEW', 4: 'DUPLICATE', 5: 'NEW', 6: 'ERROR', 7: 'DUPLICATE',
+        })
+        self.assertEqual(
+            (batch.processed, batch.new_count, batch.duplicate_count, batch.error_count), (6, 2, 3, 1)
+        )
+        self.assertFalse(FinancialRecord.objects.filter(comprobante__startswith='NUEVO').exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'El motor COPY solo existe en PostgreSQL')
+class CopyImportEngineTests(ReceiptImportEngineTests, TransactionTestCase):
+    # TransactionTestCase: la tabla temporal es ON COMMIT DROP y debe confirmarse de verdad
+    engine = CSVProcessor.ENGINE_COPY
+
+
+class ExistsFilterEquivalenceTests(RecordsTestData, TestCase):
+    """Los filtros con EXISTS devuelven las mismas filas que los JOIN + DISTINCT anteriores."""
+
+    SEARCHES = ['ana', 'AN', '111', '1', 'luis', '22', 'maria', 'zzz']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ana = Client.objects.create(name='ANA', dni='111')
+        cls.luis = Client.objects.create(name='LUIS', dni='222')
+        cls.maria = Client.objects.create(name='MARIA', dni='333')
+        cls.other_origen = OrigenTransaccion.objects.create(name='CONSIGNACION')
+        cls.t_ana = Transaction.objects.create(
+            vendedor=cls.seller, transaction_type=cls.transaction_type, expected_amount=1, cliente=cls.ana
+        )
+        cls.t_luis = Transaction.objects.create(
+            vendedor=cls.seller, transaction_type=cls.transaction_type, expected_amount=1, cliente=cls.luis
+        )
+        cls.t_none = Transaction.objects.create(
+            vendedor=cls.seller, transaction_type=cls.transaction_type, expected_amount=1
+        )
+
+    def setUp(self):
+        # Dos recibos del mismo origen en t_ana: el JOIN repetía la transacción
+        self.make_receipt('A-1', transaction=self.t_ana)
+        self.make_receipt('A-2', transaction=self.t_ana)
+        self.make_receipt('A-3', transaction=self.t_ana, origen_transaccion=self.other_origen)
+        self.luis_receipt = self.make_receipt('L-1', transaction=self.t_luis)
+        # Recibo con cliente directo distinto del de su transacción
+        self.mixed_receipt = self.make_receipt('L-2', transaction=self.t_luis, cliente=self.maria)
+        self.make_receipt('N-1', transaction=self.t_none, origen_transaccion=self.other_origen)
+        self.make_receipt('ABONO', cliente=self.maria)
+
+    def ids(self, queryset):
+        return sorted(queryset.values_list('pk', flat=True))
+
+    def test_explain_filters_command_prints_both_plans(self):
+        out = io.StringIO()
+        call_command('explain_filters', cliente='ana', stdout=out)
+
+        output = out.getvalue()
+        self.assertEqual(output.count('-- JOIN + DISTINCT'), 3)
+        self.assertEqual(output.count('-- EXISTS'), 3)
+
+    def assertUsesExists(self, queryset):
+        sql = str(queryset.query).upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_transaction_client_filter_matches_join_distinct(self):
+        for value in self.SEARCHES:
+            with self.subTest(value=value):
+                new = TransactionFilter({'cliente': value}, queryset=Transaction.objects.all()).qs
+                old = Transaction.objects.filter(
+                    Q(cliente__name__icontains=value) | Q(cliente__dni__icontains=value)
+                ).distinct()
+                self.assertEqual(self.ids(new), self.ids(old))
+                self.assertUsesExists(new)
+
+    def test_transaction_origen_filter_matches_join_distinct(self):
+        for origen in (self.origen, self.other_origen):
+            with self.subTest(origen=origen.name):
+                new = TransactionFilter({'origen_transaccion': origen.pk}, queryset=Transaction.objects.all()).qs
+                old = Transaction.objects.filter(receipts__origen_transaccion=origen).distinct()
+                self.assertEqual(self.ids(new), self.ids(old))
+                self.assertUsesExists(new)
+
+    def test_transaction_origen_filter_returns_each_transaction_once(self):
+        # Cambio intencional: el filtro anterior (JOIN sin distinct) devolvía t_ana una vez por
+        # recibo de ese origen, inflando el total de la paginación.
+        old = Transaction.objects.filter(receipts__origen_transaccion=self.origen)
+        self.assertEqual(list(old.values_list('pk', flat=True)).count(self.t_ana.pk), 2)
+
+        new = TransactionFilter({'origen_transaccion': self.origen.pk}, queryset=Transaction.objects.all()).qs
+        self.assertEqual(list(new.values_list('pk', flat=True)).count(self.t_ana.pk), 1)
+        self.assertEqual(new.count(), 2)
+
+    def test_credit_client_filter_matches_join_distinct_on_displayed_client(self):
+        for value in self.SEARCHES:
+            with self.subTest(value=value):
+                new = CreditFilter({'display_client': value}, queryset=FinancialRecord.objects.all()).qs
+                old = FinancialRecord.objects.filter(
+                    Q(cliente__name__icontains=value) | Q(cliente__dni__icontains=value) |
+                    Q(transaction__cliente__name__icontains=value) | Q(transaction__cliente__dni__icontains=value)
+                ).distinct()
+                # Única diferencia: el recibo con cliente directo ya no coincide por el cliente de
+                # su transacción (se busca por el cliente mostrado, ver display_client)
+                expected = set(self.ids(old))
+                if value.lower() not in self.maria.name.lower() and value not in self.maria.dni:
+                    expected.discard(self.mixed_receipt.pk)
+                self.assertEqual(self.ids(new), sorted(expected))
+                self.assertUsesExists(new)
+
+    def test_credit_client_filter_searches_displayed_client(self):
+        new = CreditFilter({'display_client': 'LUIS'}, queryset=FinancialRecord.objects.all()).qs
+        self.assertEqual(self.ids(new), [self.luis_receipt.pk])
+        self.assertEqual(self.mixed_receipt.display_client(), self.maria)
+
+
+class ReceiptCounterTests(RecordsTestData, TestCase):
+
+    def counter_updates(self, queries):
+        return [q for q in queries if q['sql'].startswith('UPDATE "records_transaction" SET "receipt_count"')]
+
+    def test_formset_save_refreshes_counters_once(self):
+        transaction = self.make_transaction()
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True), db_transaction.atomic():
+                # Como create_bulk_receipts / TransactionUpdateView: un formset de 24 recibos
+                for i in range(24):
+                    self.make_receipt(f'F-{i}', transaction=transaction, hora=dt.time(8, i))
+
+        self.assertEqual(len(self.counter_updates(queries.captured_queries)), 1)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.receipt_count, 24)
+        self.assertEqual(transaction.pending_receipt_count, 24)
+        self.assertEqual(transaction.receipts_sum, Decimal('12000.00'))
+
+    def test_moving_receipts_refreshes_both_transactions(self):
+        source, target = self.make_transaction(), self.make_transaction()
+        with self.captureOnCommitCallbacks(execute=True):
+            receipt = self.make_receipt('M-1', transaction=source)
+        with self.captureOnCommitCallbacks(execute=True):
+            receipt = FinancialRecord.objects.get(pk=receipt.pk)
+            receipt.transaction = target
+            receipt.save()
+
+        source.refresh_from_db()
+        target.refresh_from_db()
+        self.assertEqual((source.receipt_count, target.receipt_count), (0, 1))
+
+    def test_rolled_back_save_does_not_leave_pending_refresh(self):
+        transaction = self.make_transaction()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with db_transaction.atomic():
+                    self.make_receipt('R-1', transaction=transaction)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.make_receipt('R-2', transaction=transaction)
+
+        refreshes = [c for c in callbacks if isinstance(c, PendingReceiptCounterRefresh)]
+        self.assertEqual(len(refreshes), 1)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.receipt_count, 1)
+
+    def test_admin_delete_selected_refreshes_counters(self):
+        transaction = self.make_transaction()
+        with self.captureOnCommitCallbacks(execute=True):
+            receipts = [self.make_receipt(f'D-{i}', transaction=transaction, hora=dt.time(9, i)) for i in range(3)]
+        admin = User.objects.create_superuser('admin', password='p')
+        self.client.force_login(admin)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/records/financialrecord/', {
+                'action': 'delete_selected',
+                '_selected_action': [r.pk for r in receipts[:2]],
+                'post': 'yes',
+            }, HTTP_HOST='localhost')
+
+        self.assertEqual(response.status_code, 302)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.receipt_count, 1)
+        self.assertEqual(transaction.receipts_sum, Decimal('500.00'))
+
+
+# Sin collectstatic no existe el manifiesto de whitenoise
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class DuplicateAttemptsHistoryListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='p')
+        DuplicateRecordAttempt.objects.bulk_create([
+            DuplicateRecordAttempt(user=cls.admin, data={'comprobante': f'C-{i}'}, comprobante=f'C-{i}')
+            for i in range(60)
+        ])
+
+    def test_renders_only_the_current_page(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/duplicates/history/', {'attempt_type': 'DUPLICATE', 'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode().count('<strong>comprobante:</strong>'), 10)
+        self.assertEqual(response.context['pagination_params'], 'attempt_type=DUPLICATE')
+        self.assertContains(response, 'href="?page=1&amp;attempt_type=DUPLICATE"')
+
+
+class UniqueTransactionIdTests(RecordsTestData, TestCase):
+
+    def transaction_writes(self, queries):
+        return [
+            q['sql'] for q in queries
+            if q['sql'].startswith(('INSERT INTO "records_transaction"', 'UPDATE "records_transaction"'))
+        ]
+
+    def test_save_builds_unique_transaction_id(self):
+        with CaptureQueriesContext(connection) as queries:
+            transaction = self.make_transaction()
+
+        self.assertRegex(transaction.unique_transaction_id, r'^[A-Z]{3}\d{4}TE\d{6}[0-9A-F]{4}$')
+        self.assertEqual(transaction.unique_transaction_id[9:15], str(transaction.pk).zfill(6))
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.unique_transaction_id[9:15], str(transaction.pk).zfill(6))
+        # Con secuencias el ID se reserva antes del INSERT; sin ellas hace falta el UPDATE
+        expected_writes = 1 if connection.vendor == 'postgresql' else 2
+        self.assertEqual(len(self.transaction_writes(queries.captured_queries)), expected_writes)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Las secuencias solo existen en PostgreSQL')
+    def test_allocate_ids_reserves_consecutive_ids(self):
+        allocated = Transaction.allocate_ids(3)
+
+        self.assertEqual(allocated, list(range(allocated[0], allocated[0] + 3)))
+        self.assertGreater(self.make_transaction().pk, allocated[-1])
+
+    @skipUnless(connection.vendor != 'postgresql', 'Comportamiento de motores sin secuencias')
+    def test_allocate_ids_without_sequences(self):
+        self.assertIsNone(Transaction.allocate_ids(3))
+
+
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'records-tests-cache'),
+    }
+}
+
+
+class FilterChoicesTests(RecordsTestData, TestCase):
+
+    def bank_filter_is_valid(self, bank):
+        return CreditFilter({'banco_llegada': bank.pk}, queryset=FinancialRecord.objects.all()).is_valid()
+
+    def test_without_shared_cache_new_bank_is_a_valid_choice(self):
+        self.assertTrue(self.bank_filter_is_valid(self.bank))
+        with self.captureOnCommitCallbacks(execute=True):
+            bank = Bank.objects.create(name='BANCO NUEVO')
+
+        self.assertTrue(self.bank_filter_is_valid(bank))
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_shared_cache_is_invalidated_on_write(self):
+        cache.clear()
+        self.assertTrue(self.bank_filter_is_valid(self.bank))
+        with self.captureOnCommitCallbacks(execute=True):
+            bank = Bank.objects.create(name='BANCO NUEVO')
+
+        self.assertTrue(self.bank_filter_is_valid(bank))
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_login_keeps_cached_users(self):
+        cache.clear()
+        model_choices(User)()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.user)
+
+        self.assertIsNotNone(cache.get('filter-choices:auth.user'))
+
+
+class BulkCreateWithUniqueIdsTests(RecordsTestData, TestCase):
+
+    def build_transactions(self, count):
+        return [
+            Transaction(
+                vendedor=self.seller, transaction_type=self.transaction_type,
+                expected_amount=Decimal('1000.00'), created_by=self.user,
+            )
+            for _ in range(count)
+        ]
+
+    def assert_unique_ids_stored(self, created):
+        stored = dict(
+            Transaction.objects.filter(pk__in=[t.pk for t in created]).values_list('pk', 'unique_transaction_id')
+        )
+        for obj in created:
+            self.assertEqual(obj.unique_transaction_id[9:15], str(obj.pk).zfill(6))
+            self.assertEqual(stored[obj.pk], obj.unique_transaction_id)
+        self.assertEqual(Transaction.history.filter(id__in=stored, history_type='+').count(), len(created))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Las secuencias solo existen en PostgreSQL')
+    def test_allocates_a_block_of_ids(self):
+        with CaptureQueriesContext(connection) as queries:
+            created = Transaction.bulk_create_with_unique_ids(self.build_transactions(5), default_user=self.user)
+
+        pks = [t.pk for t in created]
+        self.assertEqual(pks, list(range(pks[0], pks[0] + 5)))
+        self.assert_unique_ids_stored(created)
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(sum('generate_series' in q for q in sql), 1)
+        self.assertEqual(sum(q.startswith('INSERT INTO "records_transaction"') for q in sql), 1)
+        self.assertFalse(any(q.startswith('UPDATE "records_transaction"') for q in sql))
+
+    @skipUnless(connection.vendor != 'postgresql', 'Comportamiento de motores sin secuencias')
+    def test_without_sequences_fills_ids_after_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            created = Transaction.bulk_create_with_unique_ids(self.build_transactions(5), default_user=self.user)
+
+        self.assert_unique_ids_stored(created)
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(sum(q.startswith('INSERT INTO "records_transaction"') for q in sql), 1)
+        self.assertEqual(sum(q.startswith('UPDATE "records_transaction"') for q in sql), 1)
+
+    def test_keeps_existing_unique_ids(self):
+        transactions = self.build_transactions(2)
+        transactions[0].unique_transaction_id = 'IMPORTADO-1'
+
+        created = Transaction.bulk_create_with_unique_ids(transactions)
+
+        self.assertEqual(created[0].unique_transaction_id, 'IMPORTADO-1')
+        self.assertEqual(created[1].unique_transaction_id[9:15], str(created[1].pk).zfill(6))
+
+
+class CachedCountTests(RecordsTestData, TestCase):
+
+    def write_from_another_worker(self):
+        # bulk_create no envía señales: como una escritura cuya invalidación no llega a este worker
+        Client.objects.bulk_create([Client(name='OTRO', dni=f'9{i}') for i in range(3)])
+
+    def test_without_shared_cache_exact_totals_are_not_cached(self):
+        cache.clear()
+        self.assertEqual(cached_count(Client.objects.all()), (0, False))
+        self.write_from_another_worker()
+
+        self.assertEqual(cached_count(Client.objects.all()), (3, False))
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_shared_cache_keeps_totals_until_invalidated(self):
+        cache.clear()
+        self.assertEqual(cached_count(Client.objects.all()), (0, False))
+        self.write_from_another_worker()
+        self.assertEqual(cached_count(Client.objects.all()), (0, False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_list_counts(Client)
+        self.assertEqual(cached_count(Client.objects.all()), (3, False))
+
+
+class ClientBulkLoaderTests(TestCase):
+
+    def test_counts_rows_lost_to_a_concurrent_load_as_skipped(self):
+        Client.objects.create(name='ANA', dni='111')
+        df = pd.DataFrame({
+            'name': ['Ana', 'Luis', 'Luis bis', 'Maria', ''],
+            'dni': ['111', '222', '222', '333', '444'],
+        })
+        # Otra carga inserta el DNI 111 después de consultar los existentes
+        with mock.patch.object(ClientBulkLoader, '_existing_dnis', return_value=set()):
+            results = ClientBulkLoader(df).process().results
+
+        self.assertEqual(results, {'processed': 5, 'created': 2, 'duplicates': 1, 'skipped': 1, 'errors': 1})
+        self.assertEqual(Client.objects.get(dni='111').name, 'ANA')
+        self.assertEqual(Client.objects.count(), 3)
+
+
+class ImportPreviewAccessTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batch = ImportBatch.objects.create(file_name='extracto.csv')
+        cls.user = User.objects.create_user('digitador', password='p')
+
+    def get_preview(self, pk):
+        return self.client.get(f'/upload_csv/preview/{pk}/')
+
+    def test_anonymous_users_cannot_probe_batch_ids(self):
+        for pk in (self.batch.pk, self.batch.pk + 1000):
+            self.assertEqual(self.get_preview(pk).status_code, 302)
+
+    def test_non_superusers_cannot_probe_batch_ids(self):
+        self.client.force_login(self.user)
+        for pk in (self.batch.pk, self.batch.pk + 1000):
+            self.assertEqual(self.get_preview(pk).status_code, 403)
+
+    def test_superuser_gets_404_for_missing_batch(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='p'))
+        self.assertEqual(self.get_preview(self.batch.pk + 1000).status_code, 404)
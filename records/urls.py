@@ -23,6 +23,9 @@ urlpatterns = [
     path('record/<int:pk>/', views.FinancialRecordDetailView.as_view(), name='record_detail'),
     path('record/<int:pk>/delete/', views.RecordDeleteView.as_view(), name='record_delete_financial'),
     path('upload_csv/', views.csv_upload_view, name='csv_upload'),
+    path('upload_csv/preview/<int:pk>/', views.ImportPreviewView.as_view(), name='import_preview'),
+    path('upload_csv/preview/<int:pk>/commit/', views.import_commit, name='import_commit'),
+    path('upload_csv/preview/<int:pk>/discard/', views.import_discard, name='import_discard'),
     path('registro/<int:pk>/historial/', views.history_record_view, name='historial_registro'),
     path('receipts/restore/<int:history_id>/', views.restore_delete_record_view, name='restore_receipt'),
     path('receipts/deleted/', views.deleted_records_view, name='deleted_receipts_list'),
@@ -53,6 +56,7 @@ urlpatterns = [
     path('export_transactions_csv/', views.export_transactions_csv, name='export_transactions_csv'),
     path('duplicates/', views.DuplicateAttemptsListView.as_view(), name='duplicate_attempts_list'),
     path('duplicates/<int:pk>/resolve/', views.resolve_duplicate_attempt, name='resolve_duplicate_attempt'),
+    path('duplicates/bulk_resolve/', views.bulk_resolve_duplicate_attempts, name='bulk_resolve_duplicate_attempts'),
     path('duplicates/history/', views.DuplicateAttemptsHistoryListView.as_view(), name='duplicate_attempts_history_list'),
     path('duplicates/history/export/', views.export_duplicate_attempts_csv, name='export_duplicate_attempts_csv'),
     path('download_csv_template/', views.download_csv_template, name='download_csv_template'),
@@ -67,6 +71,9 @@ urlpatterns = [
     path('credits/<int:pk>/', views.CreditDetailView.as_view(), name='credit_detail'),
     path('credit/<int:pk>/update_field/', views.update_credit_field, name='update_credit_field'),
     path('credits/<int:pk>/update_status/', views.update_credit_status, name='update_credit_status'),
+    path('credits/bulk_update_status/', views.bulk_update_credit_status, name='bulk_update_credit_status'),
+    path('credits/reconciliation/', views.reconciliation_view, name='reconciliation'),
+    path('credits/reconciliation/apply/', views.reconciliation_apply, name='reconciliation_apply'),
     path('transaction/<int:pk>/create_credit_note/', views.create_credit_note_from_surplus, name='create_credit_note_from_surplus'),
     path('credit/<int:pk>/update_client/', views.update_credit_client, name='update_credit_client'),
     path('payment_documents/', views.PaymentDocumentListView.as_view(), name='payment_document_list'),
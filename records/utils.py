@@ -1,6 +1,14 @@
 import holidays
 from datetime import timedelta
 
+from django.conf import settings
+
+# Backends cuyo contenido vive en la memoria de cada proceso
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
 def calculate_effective_date(start_date, business_days_to_add):
     """
     Calcula una fecha futura sumando días hábiles (lunes a viernes),
@@ -24,3 +32,12 @@ def calculate_effective_date(start_date, business_days_to_add):
             days_added += 1
 
     return current_date
+
+
+def cache_is_shared():
+    """
+    True si la caché por defecto es compartida entre workers (Redis, memcached, BD, archivos).
+    Con LocMemCache una invalidación solo llega al worker que escribió: las cachés que dependen
+    de invalidarse al escribir no deben usarse.
+    """
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
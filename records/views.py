@@ -2,7 +2,7 @@ import csv
 from django.views.decorators.http import require_POST
 from io import TextIOWrapper
 from django.db.models import Q, Count, F
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, QueryDict
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -19,16 +19,19 @@ from .filters import FinancialRecordFilter, DuplicateRecordAttemptFilter, Transa
 from django_filters.views import FilterView
 from django.forms import inlineformset_factory
 from .forms import FinancialRecordForm, FinancialRecordUpdateForm, CSVUploadForm, BankForm, UserUpdateForm, TransactionForm, FinancialRecordFormSet, SellerForm, OrigenTransaccionForm, TransactionTypeForm, ClientForm, CreditForm, NoteUpdateForm, PaymentDocumentForm
-from .models import FinancialRecord, Bank, DuplicateRecordAttempt, AccessRequest, Transaction, Seller, OrigenTransaccion, TransactionType, Client, PaymentDocument
+from .models import FinancialRecord, Bank, DuplicateRecordAttempt, AccessRequest, Transaction, Seller, OrigenTransaccion, TransactionType, Client, PaymentDocument, ImportBatch, StagedReceipt
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.models import Group, User
 from .decorators import group_required
 from django.utils.decorators import method_decorator
-from .services import CSVProcessor 
+from .services import CSVProcessor, ClientBulkLoader, apply_credits_to_transaction, unlink_receipts_from_transaction, commit_import_batch, discard_import_batch, XLSX_EXTENSIONS, approve_pending_receipts, build_duplicate_attempt, record_duplicate_attempts, set_receipts_status, resolve_duplicate_attempts, BULK_UPDATED
+from .reconciliation import ReconciliationEngine, statement_lines_from_parsed
+from .pagination import CachedCountPaginator, KeysetPaginationMixin, PaginationParamsMixin
 from django.template.loader import render_to_string
 from .forms import AccessRequestApprovalForm 
 from .utils import calculate_effective_date
-from .forms import BulkClientUploadForm
+from .normalization import normalize_dni, normalize_client_name
+from .forms import BulkClientUploadForm, ReconciliationForm, BaseFinancialRecordInlineFormSet
 from django.utils import timezone
 from django.db.models import Q
 import json
@@ -253,15 +256,12 @@ class CreditCreateView(LoginRequiredMixin, CreateView):
             # Si el usuario confirmó un duplicado similar, creamos el registro de intento
             # que ya fue validado en el form.
             if form.cleaned_data.get('confirm_duplicate'):
-                serializable_data = {k: str(v) for k, v in form.cleaned_data.items()}
-                DuplicateRecordAttempt.objects.create(
-                    user=self.request.user,
-                    data=serializable_data,
-                    attempt_type='SIMILAR',
+                record_duplicate_attempts([build_duplicate_attempt(
+                    form.cleaned_data, self.request.user, 'SIMILAR',
                     is_resolved=True, # Lo marcamos como resuelto porque el usuario confirmó
                     resolved_by=self.request.user,
                     resolved_at=timezone.now()
-                )
+                )])
 
         messages.success(self.request, 'Abono registrado exitosamente. Queda pendiente de aprobación.')
         # Dejamos que la clase base maneje la redirección.
@@ -290,11 +290,12 @@ class CreditCreateView(LoginRequiredMixin, CreateView):
         return self.render_to_response(self.get_context_data(form=form))
 
 @method_decorator(group_required('Admin', 'Digitador', 'Validador', 'Contabilidad', 'Facturador'), name='dispatch')
-class CreditListView(LoginRequiredMixin, FilterView):
+class CreditListView(LoginRequiredMixin, KeysetPaginationMixin, FilterView):
     model = FinancialRecord
     template_name = 'records/credit_list.html'
     context_object_name = 'credits'
     paginate_by = 50
+    keyset_ordering = ('-creado', '-id')
     filterset_class = CreditFilter
 
     def get_queryset(self):
@@ -303,10 +304,10 @@ class CreditListView(LoginRequiredMixin, FilterView):
         Obtenemos solo los abonos (registros sin transacción asociada).
         Modificado para incluir todos los FinancialRecords y optimizar la carga del cliente.
         """
-        queryset = FinancialRecord.objects.all().order_by('-creado') # Eliminado el filtro transaction__isnull=True
+        queryset = FinancialRecord.objects.all().order_by('-creado', '-id') # Eliminado el filtro transaction__isnull=True
         # Optimizar la carga de datos relacionados para evitar N+1 queries
-        # Esto cargará el cliente directo y el cliente de la transacción en una sola consulta.
-        return queryset.select_related('cliente', 'transaction__cliente', 'banco_llegada', 'uploaded_by')
+        # El cliente mostrado es effective_client (directo o de la transacción, ya resuelto).
+        return queryset.select_related('effective_client', 'transaction__transaction_type', 'banco_llegada', 'uploaded_by')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -314,6 +315,7 @@ class CreditListView(LoginRequiredMixin, FilterView):
         # FilterView añade el objeto 'filter' al contexto automáticamente.
         # Podemos usarlo para obtener la URL con los filtros actuales para la paginación.
         context['filter_params'] = self.request.GET.urlencode()
+        context['status_choices'] = FinancialRecord.APROVED_CHOICES # Para las acciones en bloque
         return context
     
 
@@ -666,6 +668,7 @@ class ClientListView(LoginRequiredMixin, FilterView):
     context_object_name = 'clients' # Cambiado a 'clients' para seguir convenciones
     filterset_class = ClientFilter
     paginate_by = 50 # Mostraremos 50 clientes por página
+    paginator_class = CachedCountPaginator
 
     # def test_func(self):
     #     return self.request.user.is_superuser
@@ -686,59 +689,36 @@ def bulk_client_upload(request):
             try:
                 # Reiniciar el puntero del archivo por si se leyó antes
                 file.seek(0)
-                df = pd.read_excel(file)
+                # dtype=str evita que los DNI numéricos se lean como float (ej: '12345.0')
+                df = pd.read_excel(file, dtype=str)
             except Exception:
                 try:
                     # Si falla, intentar leer como CSV
                     file.seek(0)
-                    df = pd.read_csv(file)
+                    df = pd.read_csv(file, dtype=str)
                 except Exception as e:
                     messages.error(request, f"No se pudo leer el archivo. Asegúrate de que sea un Excel o CSV válido. Error: {e}")
                     return redirect('Client_list')
 
-            # Validar que las columnas 'name' y 'dni' existan
-            required_columns = ['name', 'dni']
-            if not all(col in df.columns for col in required_columns):
-                messages.error(request, "El archivo debe contener las columnas 'name' y 'dni'.")
+            try:
+                loader = ClientBulkLoader(df).process()
+            except ValueError as e:
+                messages.error(request, str(e))
                 return redirect('Client_list')
 
-            # Eliminar filas donde 'name' o 'dni' son nulos
-            df.dropna(subset=['name', 'dni'], inplace=True)
-
-            if df.empty:
+            if loader.results['processed'] == loader.results['errors']:
                 messages.warning(request, "El archivo no contiene registros válidos para procesar.")
                 return redirect('Client_list')
 
-            total_rows = len(df)
-            messages.info(request, f"Archivo leído correctamente. Se procesarán {total_rows} registros.")
-
-            # Iterar sobre las filas del DataFrame y crear los clientes
-            created_count = 0
-            duplicates_count = 0
-            error_count = 0
-
-            for index, row in df.iterrows():
-                # Limpiar datos de espacios en blanco
-                name = str(row['name']).strip()
-                dni = str(row['dni']).strip()
-
-                if not name or not dni:
-                    error_count += 1
-                    continue
-
-                # Verificar si ya existe un cliente con el mismo DNI
-                if Client.objects.filter(dni=dni).exists():
-                    duplicates_count += 1
-                else:
-                    try:
-                        Client.objects.create(name=name, dni=dni)
-                        created_count += 1
-                    except Exception as e:
-                        messages.error(request, f"Error al crear el cliente {name} (DNI: {dni}): {e}")
-                        error_count += 1
-            
+            messages.info(request, f"Archivo leído correctamente. Se procesaron {loader.results['processed']} registros.")
+            created_count = loader.results['created']
+            duplicates_count = loader.results['duplicates']
+            error_count = loader.results['errors']
+
             # Construir mensaje final
             message = f"Proceso finalizado. Clientes nuevos: {created_count}. Duplicados omitidos: {duplicates_count}. Errores: {error_count}."
+            if loader.results['skipped']:
+                message += f" Omitidos por una carga simultánea: {loader.results['skipped']}."
             messages.success(request, message)
             return redirect('Client_list')
     else:
@@ -1112,12 +1092,13 @@ class TransactionTypeListView(LoginRequiredMixin, UserPassesTestMixin, ListView)
 
 
 @method_decorator(group_required('Admin', 'Digitador', 'Facturador', 'Validador', 'Contabilidad'), name='dispatch')
-class TransactionListView(LoginRequiredMixin, FilterView):
+class TransactionListView(LoginRequiredMixin, KeysetPaginationMixin, FilterView):
     model = Transaction
     template_name = 'records/records_list.html'
     context_object_name = 'object_list'
     filterset_class = TransactionFilter
     paginate_by = 50
+    keyset_ordering = ('-id',)
 
     def get_queryset(self):
         """
@@ -1134,10 +1115,8 @@ class TransactionListView(LoginRequiredMixin, FilterView):
         
         # Lógica específica para el rol 'Facturador'
         if user.groups.filter(name='Facturador').exists() and not user.is_superuser:
-            queryset = queryset.annotate(
-                num_receipts=Count('receipts'),
-                num_approved_receipts=Count('receipts', filter=Q(receipts__payment_status='Aprobado'))
-            ).filter(num_receipts__gt=0, num_receipts=F('num_approved_receipts'))
+            # Listas para facturar: con recibos y todos aprobados (contadores desnormalizados, sin JOIN)
+            queryset = queryset.filter(receipt_count__gt=0, pending_receipt_count=0, rejected_receipt_count=0)
 
         return queryset.prefetch_related('receipts').order_by('-id')
 
@@ -1182,6 +1161,7 @@ FinancialRecordInlineFormSet = inlineformset_factory(
     Transaction,
     FinancialRecord,
     form=FinancialRecordForm, # Assuming FinancialRecordForm is suitable for editing
+    formset=BaseFinancialRecordInlineFormSet, # Verificación de duplicados en bloque
     extra=0, # Start with zero empty forms
     can_delete=True
 )
@@ -1247,9 +1227,10 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
         is_facturador = self.request.user.groups.filter(name='Facturador').exists()
         is_superuser = self.request.user.is_superuser
 
+        formset_valid = formset.is_valid()
         has_similar_duplicate_warning = any('confirm_duplicate' in fs_form.errors for fs_form in formset)
 
-        if formset.is_valid():
+        if formset_valid:
             if has_similar_duplicate_warning:
                 messages.warning(
                     self.request,
@@ -1276,25 +1257,16 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
 
                 self.object.save()
 
-                # 🔹 Desvincular recibos marcados
+                # 🔹 Desvincular recibos marcados (el recibo conserva el cliente de la transacción)
                 credit_ids_to_unlink = self.request.POST.getlist('unlink_credit')
                 if credit_ids_to_unlink:
-                    # Filtramos solo los recibos que pertenecen a esta transacción
-                    receipts_to_unlink = self.object.receipts.filter(pk__in=credit_ids_to_unlink)
-                    for receipt in receipts_to_unlink:
-                        receipt.cliente = self.object.cliente # ¡CLAVE! Asignamos el cliente de la transacción al recibo.
-                        receipt.transaction = None # Rompemos el vínculo
-                        receipt.save()
+                    unlink_receipts_from_transaction(self.object, credit_ids_to_unlink, self.request.user)
 
                 # 🔹 Aplicar abonos seleccionados a esta transacción
+                # Solo se aplican abonos del mismo cliente y sin transacción asignada.
                 credit_ids_to_apply = self.request.POST.getlist('apply_credit')
                 if credit_ids_to_apply:
-                    credits = FinancialRecord.objects.filter(pk__in=credit_ids_to_apply)
-                    for credit in credits:
-                        # Doble chequeo para seguridad: el abono debe pertenecer al cliente y no tener transacción asignada
-                        if credit.cliente == self.object.cliente and credit.transaction is None:
-                            credit.transaction = self.object
-                            credit.save()
+                    apply_credits_to_transaction(self.object, credit_ids_to_apply, self.request.user)
 
                 # 🔹 Lógica de guardado del formset según rol
                 if is_facturador and not is_superuser:
@@ -1317,7 +1289,8 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
                 elif not is_facturador or is_superuser:
                     # Admin / Digitador: acceso completo al formset
                     formset.instance = self.object
-                    
+                    confirmed_attempts = []
+
                     for receipt_form in formset:
                         if receipt_form.has_changed() and receipt_form.cleaned_data:
                             if receipt_form.cleaned_data.get('DELETE'):
@@ -1334,15 +1307,13 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
                                 receipt.save()
 
                                 if receipt_form.cleaned_data.get('confirm_duplicate') and is_new:
-                                    serializable_data = {k: str(v) for k, v in receipt_form.cleaned_data.items()}
-                                    DuplicateRecordAttempt.objects.create(
-                                        user=self.request.user,
-                                        data=serializable_data,
-                                        attempt_type='SIMILAR',
+                                    confirmed_attempts.append(build_duplicate_attempt(
+                                        receipt_form.cleaned_data, self.request.user, 'SIMILAR',
                                         is_resolved=True,
                                         resolved_by=self.request.user,
                                         resolved_at=timezone.now()
-                                    )
+                                    ))
+                    record_duplicate_attempts(confirmed_attempts)
 
             messages.success(self.request, self.success_message)
             return redirect(self.get_success_url())
@@ -1356,6 +1327,7 @@ class TransactionUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView)
         messages.error(self.request, 'Por favor, corrija los errores en el formulario de la transacción.')
         context = self.get_context_data(form=form)
         formset = context['formset']
+        formset.is_valid() # Ejecuta la verificación de duplicados en bloque del formset
 
         has_similar_duplicate_warning = False
         for fs_form in formset:
@@ -1757,13 +1729,23 @@ def csv_upload_view(request):
         form = CSVUploadForm(request.POST, request.FILES)
         if form.is_valid():
             csv_file = form.cleaned_data['csv_file']
-            if not csv_file.name.endswith('.csv'):
-                messages.error(request, 'Error: Por favor, sube un archivo CSV válido.')
+            if not csv_file.name.lower().endswith(('.csv',) + XLSX_EXTENSIONS):
+                messages.error(request, 'Error: Por favor, sube un archivo CSV o Excel (.xlsx) válido.')
                 return redirect('csv_upload')
             
+            if form.cleaned_data.get('preview'):
+                # Modo previsualización: se valida y clasifica el archivo sin insertar nada
+                try:
+                    processor = CSVProcessor(csv_file, user=request.user, profile=form.cleaned_data.get('profile'))
+                    batch = processor.stage(file_name=csv_file.name)
+                except Exception as e:
+                    messages.error(request, f'Ocurrió un error inesperado: {e}')
+                    return redirect('csv_upload')
+                return redirect('import_preview', pk=batch.pk)
+
             try:
                 # Delegamos el procesamiento a la nueva clase
-                processor = CSVProcessor(csv_file)
+                processor = CSVProcessor(csv_file, user=request.user, profile=form.cleaned_data.get('profile'))
                 result = processor.process()
 
                 # Mostramos los mensajes al usuario basados en el resultado
@@ -1787,6 +1769,63 @@ def csv_upload_view(request):
 
     return render(request, 'records/csv_upload_form.html', {'form': form})
 
+class ImportPreviewView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+    """Previsualización paginada de una importación: filas nuevas, duplicadas y con error."""
+    model = StagedReceipt
+    template_name = 'records/import_preview.html'
+    context_object_name = 'rows'
+    paginate_by = 50
+
+    def test_func(self):
+        return self.request.user.is_superuser
+
+    def get_queryset(self):
+        # Se busca aquí y no en dispatch(): ahí el 404 respondería antes del control de acceso
+        self.batch = get_object_or_404(ImportBatch, pk=self.kwargs['pk'])
+        queryset = self.batch.rows.all()
+        status = self.request.GET.get('status')
+        if status in dict(StagedReceipt.STATUS_CHOICES):
+            queryset = queryset.filter(status=status)
+        return queryset.order_by('line')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['batch'] = self.batch
+        context['status'] = self.request.GET.get('status', '')
+        context['status_choices'] = StagedReceipt.STATUS_CHOICES
+        return context
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@require_POST
+def import_commit(request, pk):
+    batch = get_object_or_404(ImportBatch, pk=pk)
+    try:
+        batch = commit_import_batch(batch, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('import_preview', pk=pk)
+
+    messages.success(request, f'Importación confirmada: {batch.created_count} registros creados.')
+    late_duplicates = batch.new_count - batch.created_count
+    if late_duplicates:
+        messages.warning(request, f'{late_duplicates} registros ya habían sido cargados desde la previsualización y se omitieron.')
+    return redirect('record_list')
+
+
+@user_passes_test(lambda u: u.is_superuser)
+@require_POST
+def import_discard(request, pk):
+    batch = get_object_or_404(ImportBatch, pk=pk)
+    try:
+        discard_import_batch(batch)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('import_preview', pk=pk)
+    messages.info(request, 'Importación descartada.')
+    return redirect('csv_upload')
+
+
 @method_decorator(group_required('Admin'), name='dispatch')
 class DuplicateAttemptsListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     model = DuplicateRecordAttempt
@@ -1798,7 +1837,7 @@ class DuplicateAttemptsListView(LoginRequiredMixin, UserPassesTestMixin, ListVie
         return self.request.user.is_superuser
 
     def get_queryset(self):
-        return DuplicateRecordAttempt.objects.filter(is_resolved=False).order_by('-timestamp')
+        return DuplicateRecordAttempt.objects.filter(is_resolved=False).order_by('-last_seen')
 
 @login_required
 @group_required('Admin')
@@ -1815,42 +1854,89 @@ def resolve_duplicate_attempt(request, pk):
     return redirect('duplicate_attempts_list')
 
 
-class DuplicateAttemptsHistoryListView(LoginRequiredMixin, UserPassesTestMixin, FilterView):
+@login_required
+@group_required('Admin')
+@require_POST
+def bulk_resolve_duplicate_attempts(request):
+    """
+    Marca como resueltos varios intentos de duplicado con un solo UPDATE: los seleccionados o
+    todos los pendientes. Responde JSON con el resultado por id a peticiones AJAX; si no, redirige.
+    """
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    try:
+        attempt_ids = _bulk_action_ids(
+            request, DuplicateRecordAttemptFilter, DuplicateRecordAttempt.objects.filter(is_resolved=False)
+        )
+    except ValueError as e:
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('duplicate_attempts_list')
+
+    outcomes = resolve_duplicate_attempts(attempt_ids, request.user)
+    resolved = sum(1 for outcome in outcomes.values() if outcome == BULK_UPDATED)
+    message = f'{resolved} intentos de registro duplicado marcados como resueltos.'
+    if is_ajax:
+        return JsonResponse({
+            'success': True,
+            'updated': resolved,
+            'results': {str(pk): outcome for pk, outcome in outcomes.items()},
+            'message': message,
+        })
+    messages.success(request, message)
+    if resolved < len(outcomes):
+        messages.warning(request, f'{len(outcomes) - resolved} intentos ya estaban resueltos o no existen.')
+    return redirect('duplicate_attempts_list')
+
+
+class DuplicateAttemptsHistoryListView(LoginRequiredMixin, UserPassesTestMixin, PaginationParamsMixin, FilterView):
     model = DuplicateRecordAttempt
     template_name = 'records/duplicate_attempts_history_list.html'
     context_object_name = 'attempts'
     filterset_class = DuplicateRecordAttemptFilter
     paginate_by = 50
+    paginator_class = CachedCountPaginator
 
     def test_func(self):
         return self.request.user.is_superuser
 
     def get_queryset(self):
-        return DuplicateRecordAttempt.objects.all().order_by('-timestamp')
+        return DuplicateRecordAttempt.objects.select_related('user', 'resolved_by').order_by('-timestamp')
 
 
-@method_decorator(group_required('Admin'), name='dispatch')
+@login_required
+@group_required('Admin')
 def export_duplicate_attempts_csv(request):
     if not request.user.is_superuser:
         messages.error(request, 'No tienes permisos para realizar esta acción.')
         return redirect('duplicate_attempts_history_list')
 
-    filterset = DuplicateRecordAttemptFilter(request.GET, queryset=DuplicateRecordAttempt.objects.all().order_by('-timestamp'))
+    queryset = DuplicateRecordAttempt.objects.select_related('user', 'resolved_by', 'banco_llegada').order_by('-timestamp')
+    filterset = DuplicateRecordAttemptFilter(request.GET, queryset=queryset)
 
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="duplicate_attempts.csv"'
 
     writer = csv.writer(response)
     writer.writerow([
-        'Timestamp', 'User', 'Data', 'Resolved By', 'Resolved At'
+        'Timestamp', 'Last Seen', 'Occurrences', 'User', 'Type', 'Bank', 'Date', 'Time', 'Receipt', 'Amount',
+        'Data', 'Resolved By', 'Resolved At'
     ])
 
-    for attempt in filterset.qs:
+    for attempt in filterset.qs.iterator(chunk_size=2000):
         resolved_by_username = attempt.resolved_by.username if attempt.resolved_by else 'N/A'
         resolved_at_timestamp = attempt.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if attempt.resolved_at else 'N/A'
         writer.writerow([
             attempt.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            attempt.user.username,
+            attempt.last_seen.strftime('%Y-%m-%d %H:%M:%S'),
+            attempt.occurrences,
+            attempt.user.username if attempt.user else 'Sistema',
+            attempt.attempt_type,
+            attempt.banco_llegada.name if attempt.banco_llegada else '',
+            attempt.fecha or '',
+            attempt.hora or '',
+            attempt.comprobante,
+            attempt.valor if attempt.valor is not None else '',
             str(attempt.data),
             resolved_by_username,
             resolved_at_timestamp
@@ -1867,6 +1953,11 @@ def create_bulk_receipts(request):
         transaction_form = TransactionForm(request.POST)
         formset = FinancialRecordFormSet(request.POST, form_kwargs=form_kwargs)
 
+        # Validar ambos formularios. Las advertencias de duplicados se calculan en el clean()
+        # del formset (en bloque), así que se revisan después de validarlo.
+        transaction_form_valid = transaction_form.is_valid()
+        formset_valid = formset.is_valid()
+
         # Variable para rastrear si hay advertencias de duplicados similares
         has_similar_duplicate_warning = False
         for form in formset:
@@ -1874,8 +1965,7 @@ def create_bulk_receipts(request):
                 has_similar_duplicate_warning = True
                 break
 
-        # Validar ambos formularios
-        if transaction_form.is_valid() and formset.is_valid():
+        if transaction_form_valid and formset_valid:
             # Si hay advertencias de duplicados similares Y el usuario NO ha marcado la casilla de confirmación
             if has_similar_duplicate_warning:
                 messages.warning(request, 'Se detectaron posibles duplicados. Por favor, revisa las advertencias y marca la casilla de confirmación si deseas guardar de todos modos.')
@@ -1906,14 +1996,10 @@ def create_bulk_receipts(request):
                 # 🔹 Aplicar abonos seleccionados a la nueva transacción
                 credit_ids_to_apply = request.POST.getlist('apply_credit')
                 if credit_ids_to_apply:
-                    # Buscamos los abonos que pertenecen al cliente y no tienen transacción asignada
-                    credits_to_apply = FinancialRecord.objects.filter(
-                        pk__in=credit_ids_to_apply,
-                        cliente=new_transaction.cliente,
-                        transaction__isnull=True
-                    )
-                    credits_to_apply.update(transaction=new_transaction)
+                    # Solo abonos del cliente y sin transacción asignada; deja rastro en el historial
+                    apply_credits_to_transaction(new_transaction, credit_ids_to_apply, request.user)
 
+                confirmed_attempts = []
                 for form in formset:
                     if form.has_changed() and form.cleaned_data:
                         if form.cleaned_data.get('DELETE'):
@@ -1927,15 +2013,13 @@ def create_bulk_receipts(request):
 
                             # Si un duplicado similar fue confirmado por el usuario, registrarlo como resuelto
                             if form.cleaned_data.get('confirm_duplicate'):
-                                serializable_data = {k: str(v) for k, v in form.cleaned_data.items()}
-                                DuplicateRecordAttempt.objects.create(
-                                    user=request.user,
-                                    data=serializable_data,
-                                    attempt_type='SIMILAR',
+                                confirmed_attempts.append(build_duplicate_attempt(
+                                    form.cleaned_data, request.user, 'SIMILAR',
                                     is_resolved=True, # Marcar como resuelto porque el usuario confirmó
                                     resolved_by=request.user,
                                     resolved_at=timezone.now()
-                                )
+                                ))
+                record_duplicate_attempts(confirmed_attempts)
 
             messages.success(request, 'Transacción y recibos guardados exitosamente.')
             return redirect('record_list')
@@ -2061,9 +2145,16 @@ def search_clients(request):
     
     results = []
     if len(term) >= 2: # Empezar a buscar con al menos 2 caracteres
-        clients = Client.objects.filter(
-            Q(name__icontains=term) | Q(dni__icontains=term)
-        ).order_by('name')[:10] # Limitar a 10 resultados para un buen rendimiento
+        # Normalizamos el término igual que Client.save para que coincida con lo almacenado
+        # (ej: 'pérez' -> 'PREZ', '1.234.567' -> '1234567').
+        name_term = normalize_client_name(term)
+        dni_term = normalize_dni(term)
+        query = Q(pk__in=[])
+        if name_term:
+            query |= Q(name__icontains=name_term)
+        if dni_term:
+            query |= Q(dni__icontains=dni_term)
+        clients = Client.objects.filter(query).order_by('name')[:10] # Limitar a 10 resultados para un buen rendimiento
 
         for client in clients:
             results.append({
@@ -2190,6 +2281,132 @@ def update_credit_status(request, pk):
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
 
+# Máximo de elementos por acción en bloque (seleccionados o "todos los filtrados")
+BULK_ACTION_LIMIT = 5000
+
+
+def _bulk_action_ids(request, filterset_class, queryset):
+    """
+    Ids sobre los que aplicar una acción en bloque: los seleccionados (POST 'ids') o, con
+    'select_all', todos los que cumplen el filtro de la lista (POST 'filter_params', la
+    querystring de la lista). Lanza ValueError con un mensaje para el usuario si no son válidos.
+    """
+    if request.POST.get('select_all'):
+        filterset = filterset_class(QueryDict(request.POST.get('filter_params', '')), queryset=queryset)
+        # Un filtro inválido se ignoraría y la acción alcanzaría más registros de los mostrados
+        if not filterset.is_valid():
+            raise ValueError('Los filtros de la lista no son válidos.')
+        ids = list(filterset.qs.order_by().values_list('pk', flat=True)[:BULK_ACTION_LIMIT + 1])
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+    if not ids:
+        raise ValueError('No se seleccionó ningún elemento.')
+    if len(ids) > BULK_ACTION_LIMIT:
+        raise ValueError(f'Se pueden procesar como máximo {BULK_ACTION_LIMIT} elementos por acción.')
+    return ids
+
+
+@require_POST
+@login_required
+def bulk_update_credit_status(request):
+    """
+    Cambia el estado de varios recibos a la vez vía AJAX (un UPDATE y un INSERT de historial).
+    Responde con el resultado por id. Solo accesible por superusuarios y validadores.
+    """
+    if not (request.user.is_superuser or request.user.groups.filter(name='Validador').exists()):
+        return JsonResponse({'success': False, 'message': 'No tienes permiso para realizar esta acción.'}, status=403)
+
+    new_status = request.POST.get('payment_status')
+    valid_statuses = [choice[0] for choice in FinancialRecord.APROVED_CHOICES]
+    if new_status not in valid_statuses:
+        return JsonResponse({'success': False, 'message': 'Estado no válido.'}, status=400)
+
+    try:
+        receipt_ids = _bulk_action_ids(request, CreditFilter, FinancialRecord.objects.all())
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    outcomes = set_receipts_status(receipt_ids, new_status, request.user)
+    updated = sum(1 for outcome in outcomes.values() if outcome == BULK_UPDATED)
+    return JsonResponse({
+        'success': True,
+        'updated': updated,
+        'results': {str(pk): outcome for pk, outcome in outcomes.items()},
+        'message': f'{updated} de {len(outcomes)} recibos actualizados a "{new_status}".',
+    })
+
+
+@login_required
+@group_required('Validador')
+def reconciliation_view(request):
+    """
+    Concilia un extracto bancario contra los recibos pendientes. Las coincidencias seguras
+    pueden aprobarse automáticamente; el resto se proponen para aprobarlas en bloque.
+    """
+    if request.method != 'POST':
+        return render(request, 'records/reconciliation.html', {'form': ReconciliationForm()})
+
+    form = ReconciliationForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return render(request, 'records/reconciliation.html', {'form': form})
+
+    statement_file = form.cleaned_data['statement_file']
+    try:
+        processor = CSVProcessor(statement_file, user=request.user, profile=form.cleaned_data.get('profile'))
+        statement_lines, unknown_bank_lines = statement_lines_from_parsed(processor.parse_lines())
+    except Exception as e:
+        messages.error(request, f'No se pudo leer el extracto: {e}')
+        return render(request, 'records/reconciliation.html', {'form': form})
+
+    engine = ReconciliationEngine(
+        amount_tolerance=form.cleaned_data['amount_tolerance'],
+        time_tolerance_minutes=form.cleaned_data['time_tolerance'],
+    ).load_statement(statement_lines)
+    matches, unmatched_lines = engine.match()
+
+    approved_ids = set()
+    if form.cleaned_data['auto_apply']:
+        approved_ids = set(approve_pending_receipts([m.receipt_id for m in matches if m.confident], request.user))
+        if approved_ids:
+            messages.success(request, f'{len(approved_ids)} recibos aprobados automáticamente.')
+
+    receipts = FinancialRecord.objects.select_related('banco_llegada', 'origen_transaccion').in_bulk(
+        [m.receipt_id for m in matches]
+    )
+    rows = [
+        {'match': m, 'receipt': receipts[m.receipt_id], 'approved': m.receipt_id in approved_ids}
+        for m in matches
+    ]
+    for error in processor.results['line_errors'][:10]:
+        messages.warning(request, error)
+
+    context = {
+        'form': form,
+        'reconciled': True,
+        'rows': rows,
+        'pending_count': sum(1 for row in rows if not row['approved']),
+        'statement_count': len(statement_lines),
+        'unmatched_lines': unmatched_lines,
+        'unknown_bank_lines': unknown_bank_lines,
+        'error_count': len(processor.results['line_errors']),
+    }
+    return render(request, 'records/reconciliation.html', context)
+
+
+@require_POST
+@login_required
+@group_required('Validador')
+def reconciliation_apply(request):
+    """Aprueba en bloque los recibos propuestos por la conciliación que el usuario seleccionó."""
+    receipt_ids = [int(pk) for pk in request.POST.getlist('receipt_ids') if pk.isdigit()]
+    approved = approve_pending_receipts(receipt_ids, request.user)
+    skipped = len(receipt_ids) - len(approved)
+    messages.success(request, f'{len(approved)} recibos aprobados.')
+    if skipped:
+        messages.warning(request, f'{skipped} recibos ya no estaban pendientes y se omitieron.')
+    return redirect('reconciliation')
+
+
 @require_POST
 @login_required
 @group_required('Admin', 'Digitador')
@@ -2269,7 +2486,7 @@ def create_credit_note_from_surplus(request, pk):
         return redirect('transaction_update', pk=pk)
 
 
-class FinancialRecordFormSet(inlineformset_factory(Transaction, FinancialRecord, form=FinancialRecordForm, extra=0, can_delete=True)):
+class FinancialRecordFormSet(inlineformset_factory(Transaction, FinancialRecord, form=FinancialRecordForm, formset=BaseFinancialRecordInlineFormSet, extra=0, can_delete=True)):
     
     def clean(self):
         super().clean()
@@ -2303,7 +2520,7 @@ def export_credits_csv(request):
     # 1. Obtenemos todos los recibos. Usamos select_related y prefetch_related
     #    para optimizar la consulta y evitar múltiples accesos a la base de datos.
     queryset = FinancialRecord.objects.select_related(
-        'banco_llegada', 'uploaded_by', 'cliente', 'transaction__cliente'
+        'banco_llegada', 'uploaded_by', 'effective_client', 'transaction'
     ).order_by('-fecha', '-hora')
 
     # 2. Aplicamos el mismo filtro que en la vista de lista.